@@ -1,3 +1,8 @@
+import sys
+from startup_profile import StartupProfile
+startup = StartupProfile(trace_imports = '--startup-profile' in sys.argv)
+
+import argparse
 import moderngl as gl
 import moderngl_window as glw
 from logger import logger
@@ -5,6 +10,15 @@ from moderngl_window.conf import settings
 from moderngl_window.timers.clock import Timer
 from resource_manager import ResourceManger
 from scene_builder import SceneBuilder
+from input_recorder import InputRecorder
+startup.mark('imports')
+
+parser = argparse.ArgumentParser(description="Cubes")
+parser.add_argument('--world', help="region file to stream the scene from")
+parser.add_argument('--record', help="log the input to this file, replay it with headless.py --replay")
+parser.add_argument('--startup-profile', action='store_true',
+                    help="log import and init times up to the first frame, then quit")
+args = parser.parse_args()
 
 # Create Window
 settings.WINDOW = {
@@ -18,6 +32,7 @@ settings.WINDOW = {
     "vsync": True
 }
 window = glw.create_window_from_settings()
+startup.mark('window')
 
 # OpenGL context configuration
 ctx = window.ctx
@@ -26,9 +41,13 @@ ctx.enable(gl.DEPTH_TEST | gl.CULL_FACE)
 # Load OpenGL resource
 ResourceManger.initialize()
 ResourceManger.load_all_resources()
+startup.mark('resources')
 
 # Init window event handlers
-cube_builder = SceneBuilder(window)
+cube_builder = SceneBuilder(window, journaled = not args.record)
+if args.world:
+    cube_builder.stream(args.world)
+startup.mark('scene')
 window.render_func = getattr(cube_builder, "render")
 window.mouse_press_event_func = getattr(cube_builder, "mouse_press")
 window.mouse_release_event_func = getattr(cube_builder, "mouse_release")
@@ -37,16 +56,32 @@ window.mouse_scroll_event_func = getattr(cube_builder, "mouse_scroll")
 window.mouse_position_event_func = getattr(cube_builder, "mouse_position")
 window.key_event_func = getattr(cube_builder, "key_event")
 
+recorder = InputRecorder(args.record, window, cube_builder) if args.record else None
+
 timer = Timer()
 timer.start()
 
 while not window.is_closing:
     current_time, delta = timer.next_frame()
+    if recorder is not None:
+        current_time, delta = recorder.next_frame()
     window.clear(0.2, 0.2, 0.2, 1.0)
     window.render(current_time, delta)
     window.swap_buffers()
+    if startup.first_frame_ms is None:
+        startup.first_frame()
+        startup.close()
+        if args.startup_profile:
+            for line in startup.report():
+                logger.info(line)
+            break
+        logger.info("Time to first frame: {:.1f}ms".format(startup.first_frame_ms))
 
 _, duration = timer.stop()
+ResourceManger.log_load_times()
+cube_builder.close()
+if recorder is not None:
+    recorder.close()
 window.destroy()
 
 if duration > 0:
@@ -66,6 +66,11 @@ class Camera(object):
                 case KeyActions.RIGHT:
                     self.xdir = POSITIVE
     
+    # advance the simulation by one step, then view the result
+    def look_and_move(self, t, dt):
+        self.step(t, dt)
+        return self.view(1.0)
+    
     @property
     def is_moving(self):
         return self.xdir!=STILL or self.ydir!=STILL or self.zdir!=STILL
@@ -84,6 +89,7 @@ class OrbitCamera(Camera):
         self.radius = zoom_init
         
         self.target = Vector3([0.0, 0.0, 0.0])
+        self.previous_target = self.target.copy()
         self.up = Vector3([0.0, 0.0, 1.0])
         self.update_eye()
         
@@ -91,7 +97,8 @@ class OrbitCamera(Camera):
         self.ydir = STILL
         self.zdir = STILL
         
-    def look_and_move(self, t, dt):
+    def step(self, t, dt):
+        self.previous_target = self.target.copy()
         if self.xdir != STILL:
             self.target += self.right * self.xdir * self.velocity * dt
         if self.ydir != STILL:
@@ -99,10 +106,13 @@ class OrbitCamera(Camera):
         if self.zdir != STILL:
             self.target += self.up * self.zdir * self.velocity * dt
         self.position = self.target + self.eye 
-        
+    
+    # view between the last two steps, alpha in [0, 1]
+    def view(self, alpha):
+        target = self.previous_target + (self.target - self.previous_target) * alpha
         return Matrix44.look_at(
-            self.position,
-            self.target,  #what to look at
+            target + self.eye,
+            target,  #what to look at
             self.up)  #camera up direction (change for rolling the camera)
  
     def move_state(self, action: KeyActions, key_pressed):
@@ -151,7 +161,7 @@ class WalkCamera(Camera):
         self.max_look_up = 30
         self.max_look_down = -85
         self.max_fly_time = 1.0    #seconds
-        self.link = Linkage()
+        self.link = Linkage(tracker.live_table)
         self.reset()
         
     def reset(self):
@@ -176,8 +186,11 @@ class WalkCamera(Camera):
             self.position = self.tracker.reset_eye_position(self.position)
             if self.position is None:
                 self.reset_eye()
+        self.previous_position = self.position.copy()    #no interpolation across a reset
         
-    def look_and_move(self, t, dt):
+    # one physics step: walking, flying and riding live cubes
+    def step(self, t, dt):
+        self.previous_position = self.position.copy()
         if not self.is_moving:
             if self.link.linked:
                 self.position = self.link.get_linked_eye(t)
@@ -200,10 +213,13 @@ class WalkCamera(Camera):
                 self.fly_to(next_pos, t, dt) 
             if (not SceneGenerator.is_in_grid(self.position.xy)) and (self.position.z<0):
                 self.reset()   #back to origin
-            
+    
+    # view between the last two steps, alpha in [0, 1]
+    def view(self, alpha):
+        eye = self.previous_position + (self.position - self.previous_position) * alpha
         return Matrix44.look_at(
-            self.position,
-            self.position + self.dir,
+            eye,
+            eye + self.dir,
             self.up)
     
     def move_to(self, next_pos, t):
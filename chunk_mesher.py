@@ -0,0 +1,164 @@
+import numpy
+from scene_generator import unit_size, base_center
+from cube_store import CubeStore, CubeChunk, chunk_size
+
+# vertex layout of chunk meshes: in_vert, in_normal, in_color
+vertex_size = 9
+
+class ChunkMesher(object):
+    # triangle list of the exposed faces of a chunk, shape (n, vertex_size)
+    # greedy: merge neighbouring faces of the same colour into larger quads
+    # scale: level of detail, blocks of scale^3 cells are meshed as one super-voxel
+    @classmethod
+    def mesh(cls,
+             store: CubeStore,
+             chunk: CubeChunk,
+             greedy = False,
+             scale = 1):
+        occupancy = cls.occupancy(store, chunk)
+        colors = store.data['color'][chunk.slots]
+        if scale > 1:
+            occupancy = cls._downsample(occupancy, scale)
+            colors = cls._downsample_colors(chunk.occupancy, colors, scale)
+        vertices = []
+        for axis in range(3):
+            for side in (-1, 1):
+                faces = cls.exposed_faces(occupancy, axis, side)
+                if not faces.any():
+                    continue
+                if greedy:
+                    cells, sizes, face_colors = cls._merge_faces(faces, colors, axis)
+                else:
+                    cells = numpy.argwhere(faces)
+                    sizes = numpy.ones((len(cells), 2))
+                    face_colors = colors[faces]
+                vertices.append(cls.quads(cells, sizes, face_colors, axis, side,
+                                          chunk.origin, scale))
+        if not vertices:
+            return numpy.zeros((0, vertex_size), dtype='f4')
+        return numpy.concatenate(vertices)
+
+    # chunk occupancy padded by pad cells, border cells come from the face neighbours
+    @classmethod
+    def occupancy(cls, store: CubeStore, chunk: CubeChunk, pad = 1):
+        size = chunk_size + 2*pad
+        occupancy = numpy.zeros((size, size, size), dtype=bool)
+        inner = slice(pad, -pad)
+        occupancy[inner, inner, inner] = chunk.occupancy
+        for axis in range(3):
+            for side in (-1, 1):
+                key = list(chunk.key)
+                key[axis] += side
+                neighbor = store.chunks.get(tuple(key))
+                if neighbor is None:
+                    continue
+                source = [slice(None)] * 3
+                source[axis] = slice(chunk_size-pad, None) if side < 0 else slice(0, pad)
+                target = [inner] * 3
+                target[axis] = slice(0, pad) if side < 0 else slice(chunk_size+pad, None)
+                occupancy[tuple(target)] = neighbor.slots[tuple(source)] >= 0
+        return occupancy
+
+    # occupied cells whose face towards side along axis is not covered
+    @classmethod
+    def exposed_faces(cls, occupancy, axis, side):
+        size = occupancy.shape[0] - 2
+        neighbor = [slice(1, -1)] * 3
+        neighbor[axis] = slice(1+side, size+1+side)
+        return occupancy[1:-1, 1:-1, 1:-1] & ~occupancy[tuple(neighbor)]
+
+    # two triangles per face rectangle, sizes are the rectangle extents in cells
+    # along the two in-plane axes u, v (u x v points along +axis)
+    # cells are local to the chunk at origin, in units of scale grid cells
+    @classmethod
+    def quads(cls, cells, sizes, colors, axis, side, origin = (0, 0, 0), scale = 1):
+        u, v = (axis+1) % 3, (axis+2) % 3
+        corner = cells.astype('f8') * scale + origin - 0.5
+        corner[:, axis] += scale * (1 + side) / 2
+        du = numpy.zeros((len(cells), 3))
+        dv = numpy.zeros((len(cells), 3))
+        du[:, u] = sizes[:, 0] * scale
+        dv[:, v] = sizes[:, 1] * scale
+
+        p00, p10, p11, p01 = corner, corner+du, corner+du+dv, corner+dv
+        if side > 0:
+            corners = (p00, p10, p11, p00, p11, p01)
+        else:
+            corners = (p00, p11, p10, p00, p01, p11)
+        positions = numpy.stack(corners, axis=1) * unit_size + base_center
+
+        normal = numpy.zeros(3)
+        normal[axis] = side
+        vertices = numpy.empty((len(cells), 6, vertex_size), dtype='f4')
+        vertices[:, :, 0:3] = positions
+        vertices[:, :, 3:6] = normal
+        vertices[:, :, 6:9] = colors[:, None, :]
+        return vertices.reshape(-1, vertex_size)
+
+    # a super-voxel is occupied when any of its cells is. The neighbour chunks
+    # may be drawn at full detail, so a border face is only hidden when every
+    # neighbour cell right across it is occupied, else it would leave a crack.
+    # occupancy: padded by one cell, see occupancy()
+    @classmethod
+    def _downsample(cls, occupancy, scale):
+        n = chunk_size // scale
+        coarse = numpy.zeros((n+2, n+2, n+2), dtype=bool)
+        inner = occupancy[1:-1, 1:-1, 1:-1]
+        coarse[1:-1, 1:-1, 1:-1] = inner.reshape(n, scale, n, scale, n, scale).any(axis=(1, 3, 5))
+        for axis in range(3):
+            for side in (0, -1):
+                layer = [slice(1, -1)] * 3
+                layer[axis] = side
+                covered = occupancy[tuple(layer)].reshape(n, scale, n, scale).all(axis=(1, 3))
+                target = [slice(1, -1)] * 3
+                target[axis] = side
+                coarse[tuple(target)] = covered
+        return coarse
+
+    # mean colour of the occupied cells of every super-voxel
+    @classmethod
+    def _downsample_colors(cls, occupancy, colors, scale):
+        n = chunk_size // scale
+        weights = occupancy.reshape(n, scale, n, scale, n, scale).sum(axis=(1, 3, 5))
+        colors = numpy.where(occupancy[..., None], colors, 0.0)
+        sums = colors.reshape(n, scale, n, scale, n, scale, 3).sum(axis=(1, 3, 5))
+        return sums / numpy.maximum(weights, 1)[..., None]
+
+    # greedy meshing of one face direction, slice by slice along axis
+    @classmethod
+    def _merge_faces(cls, faces, colors, axis):
+        u, v = (axis+1) % 3, (axis+2) % 3
+        _, color_ids = numpy.unique(colors.reshape(-1, 3), axis=0, return_inverse=True)
+        color_ids = color_ids.reshape(faces.shape)
+        faces = numpy.moveaxis(faces, (axis, u, v), (0, 1, 2))
+        color_ids = numpy.moveaxis(color_ids, (axis, u, v), (0, 1, 2))
+        slice_colors = numpy.moveaxis(colors, (axis, u, v), (0, 1, 2))
+
+        size = faces.shape[0]
+        cells, sizes, rect_colors = [], [], []
+        for d in range(size):
+            if not faces[d].any():
+                continue
+            todo = faces[d].tolist()
+            ids = color_ids[d].tolist()
+            for i, j in numpy.argwhere(faces[d]).tolist():
+                if not todo[i][j]:
+                    continue
+                color = ids[i][j]
+                w = 1
+                while i+w < size and todo[i+w][j] and ids[i+w][j] == color:
+                    w += 1
+                h = 1
+                while j+h < size and all(todo[i+k][j+h] and ids[i+k][j+h] == color
+                                               for k in range(w)):
+                    h += 1
+                for k in range(w):
+                    for l in range(h):
+                        todo[i+k][j+l] = False
+
+                cell = [0, 0, 0]
+                cell[axis], cell[u], cell[v] = d, i, j
+                cells.append(cell)
+                sizes.append((w, h))
+                rect_colors.append(slice_colors[d, i, j])
+        return (numpy.array(cells), numpy.array(sizes, dtype='f8'), numpy.array(rect_colors))
@@ -0,0 +1,258 @@
+import numpy
+from collections import deque
+import moderngl as gl
+from pyrr import Matrix44
+from resource_manager import ResourceManger, LazyProgram
+from cube_store import CubeStore, lod_margin
+from chunk_mesher import ChunkMesher
+from frustum import Frustum
+from scene_generator import SceneGenerator, unit_size
+
+# eye distance below which a chunk box is drawn without an occlusion test
+near_margin = 0.1
+# frames before an occlusion query result is read, reading it sooner stalls
+# until the GPU has drawn that frame
+query_latency = 3
+
+# level of detail: far chunks are meshed from super-voxels of scale^3 cells,
+# the coarsest scale whose super-voxel still spans at most lod_pixels is used
+lod_scales = (2, 4)
+lod_pixels = 12.0
+assert max(lod_scales) <= lod_margin
+
+class ChunkMesh(object):
+    def __init__(self, key):
+        self.key = key
+        self.vbo = None
+        self.vao = None
+        self.vertex_count = 0
+        self.box_min = None
+        self.box_max = None
+        self.queries = deque()    #(frame, query) of the pending occlusion queries
+        self.result_frame = None    #frame of the last query read back
+        self.samples = 0    #samples passed in that frame
+        self.lods = dict()    #scale: (vbo, vao, vertex count)
+        self.draw = None    #(vao, vertex count) picked for the current frame
+
+# Static cubes drawn as one mesh of exposed faces per chunk.
+# Only chunks marked dirty in the store are re-meshed.
+class ChunkRender(object):
+    def __init__(self,
+                 ctx: gl.Context,
+                 store: CubeStore,
+                 greedy = False):
+        self.ctx = ctx
+        self.store = store
+        self.greedy = greedy
+        self.prog = ResourceManger.get_shader('chunk')
+        self.meshes = dict()
+        self.store.dirty.update(self.store.chunks.keys())
+        self.drawn = 0
+        self.culled = 0
+        self.lod = True
+        self.pixel_scale = None    #pixels covered by one unit at distance 1
+        self.init_occlusion()
+
+    def init_occlusion(self):
+        self.occlusion = False
+        self.occluded = 0
+        self.frame = 0
+        self.free_queries = []
+        self.prog_box = LazyProgram('bbox')
+        self.unit_box = None
+        self.vao_box = None    #created when occlusion culling first runs
+
+    def set_projection(self, proj: Matrix44, height = None):
+        self.prog['proj'].write(proj.astype('f4'))
+        self.prog_box.write('proj', proj.astype('f4'))
+        if height is not None:
+            self.pixel_scale = proj[1][1] * height / 2
+
+    def update_view(self, mv: Matrix44):
+        self.prog['mv'].write(mv.astype('f4'))
+        self.prog_box.write('mv', mv.astype('f4'))
+
+    def set_greedy(self, greedy):
+        self.greedy = greedy
+        self.store.dirty.update(self.store.chunks.keys())
+
+    def update(self):
+        for key in self.store.lod_dirty - self.store.dirty:
+            if key in self.meshes:
+                self._release_lods(self.meshes[key])
+        self.store.lod_dirty.clear()
+        for key in self.store.dirty:
+            chunk = self.store.chunks.get(key)
+            if key in self.meshes:
+                self._release_lods(self.meshes[key])
+            if chunk is None:
+                self._release(key)
+                continue
+            vertices = ChunkMesher.mesh(self.store, chunk, self.greedy)
+            if len(vertices) == 0:
+                self._release(key)
+                continue
+            self._upload(self.meshes.get(key) or ChunkMesh(key), vertices)
+        self.store.dirty.clear()
+
+    def render(self, frustum: Frustum = None, eye = None):
+        self.update()
+        meshes = self.visible_meshes(frustum)
+        self.culled = len(self.meshes) - len(meshes)
+        self.select_lods(meshes, eye)
+        if self.occlusion and eye is not None:
+            self.render_occluded(meshes, eye)
+            return
+        
+        for mesh in meshes:
+            self._draw(mesh)
+        self.drawn = len(meshes)
+        self.occluded = 0
+    
+    # Occlusion culling with temporal coherence:
+    # chunks visible a few frames ago (query_latency) are drawn front to back
+    # inside a query, the others only get their bounding box tested against
+    # that depth and are drawn under conditional rendering, so a chunk coming
+    # into view is never missing for a frame. Chunks without a recent result
+    # count as visible.
+    def render_occluded(self, meshes, eye):
+        if self.vao_box is None:
+            self.unit_box = self.ctx.buffer(SceneGenerator.cube(1.0, (0.5, 0.5, 0.5)))
+            self.vao_box = self.ctx.vertex_array(self.prog_box.get(), self.unit_box, 'in_vert')
+        self.frame += 1
+        eye = numpy.asarray(eye, dtype='f8')
+        visible, hidden = [], []
+        for mesh in meshes:
+            self._read_queries(mesh)
+            # no result yet, or one too old to say anything about the current view
+            was_visible = (mesh.result_frame is None or mesh.result_frame < self.frame - query_latency
+                           or mesh.samples > 0)
+            if was_visible or self._is_near(mesh, eye):
+                visible.append(mesh)
+            else:
+                hidden.append(mesh)
+            query = self.free_queries.pop() if self.free_queries else self.ctx.query(samples=True)
+            mesh.queries.append((self.frame, query))
+        
+        visible.sort(key=lambda mesh: numpy.sum(((mesh.box_min+mesh.box_max)/2 - eye)**2))
+        for mesh in visible:
+            with mesh.queries[-1][1]:
+                self._draw(mesh)
+        
+        if hidden:
+            fbo = self.ctx.fbo
+            color_mask, depth_mask = fbo.color_mask, fbo.depth_mask
+            fbo.color_mask = (False, False, False, False)
+            fbo.depth_mask = False
+            prog_box = self.prog_box.get()
+            for mesh in hidden:
+                prog_box['box_min'].value = tuple(mesh.box_min)
+                prog_box['box_size'].value = tuple(mesh.box_max - mesh.box_min)
+                with mesh.queries[-1][1]:
+                    self.vao_box.render(gl.TRIANGLES)
+            fbo.color_mask, fbo.depth_mask = color_mask, depth_mask
+            for mesh in hidden:
+                with mesh.queries[-1][1].crender:
+                    self._draw(mesh)
+        
+        self.drawn = len(visible)
+        self.occluded = len(hidden)
+    
+    def visible_meshes(self, frustum: Frustum = None):
+        meshes = list(self.meshes.values())
+        if frustum is None or not meshes:
+            return meshes
+        visible = frustum.boxes_visible([mesh.box_min for mesh in meshes],
+                                        [mesh.box_max for mesh in meshes])
+        return [mesh for mesh, shown in zip(meshes, visible) if shown]
+
+    # pick the mesh of every chunk from the screen size of a cube at its nearest point
+    def select_lods(self, meshes, eye):
+        for mesh in meshes:
+            mesh.draw = (mesh.vao, mesh.vertex_count)
+        if not self.lod or eye is None or self.pixel_scale is None or not meshes:
+            return
+        
+        eye = numpy.asarray(eye, dtype='f8')
+        box_min = numpy.array([mesh.box_min for mesh in meshes])
+        box_max = numpy.array([mesh.box_max for mesh in meshes])
+        gap = numpy.maximum(numpy.maximum(box_min - eye, eye - box_max), 0.0)
+        distances = numpy.maximum(numpy.linalg.norm(gap, axis=1), 1e-6)
+        cube_pixels = unit_size * self.pixel_scale / distances
+        for mesh, pixels in zip(meshes, cube_pixels.tolist()):
+            scale = 1
+            for lod_scale in lod_scales:
+                if lod_scale * pixels <= lod_pixels:
+                    scale = lod_scale
+            if scale > 1:
+                mesh.draw = self._lod_mesh(mesh, scale)
+    
+    @property
+    def vertex_count(self):
+        return sum(mesh.vertex_count for mesh in self.meshes.values())
+
+    def _upload(self, mesh: ChunkMesh, vertices):
+        if mesh.vbo is None or mesh.vbo.size < vertices.nbytes:
+            if mesh.vbo is not None:
+                mesh.vao.release()
+                mesh.vbo.release()
+            mesh.vbo = self.ctx.buffer(vertices)
+            mesh.vao = self.ctx.vertex_array(
+                self.prog, [
+                    (mesh.vbo, '3f 3f 3f', 'in_vert', 'in_normal', 'in_color')
+                ])
+        else:
+            mesh.vbo.write(vertices)
+        mesh.vertex_count = len(vertices)
+        mesh.box_min = vertices[:, :3].min(axis=0)
+        mesh.box_max = vertices[:, :3].max(axis=0)
+        self.meshes[mesh.key] = mesh
+
+    def _draw(self, mesh: ChunkMesh):
+        vao, vertex_count = mesh.draw
+        if vertex_count > 0:
+            vao.render(gl.TRIANGLES, vertices=vertex_count)
+    
+    # coarse mesh of a chunk, built the first time it is needed
+    def _lod_mesh(self, mesh: ChunkMesh, scale):
+        if scale not in mesh.lods:
+            vertices = ChunkMesher.mesh(self.store, self.store.chunks[mesh.key], self.greedy, scale)
+            if len(vertices) == 0:
+                mesh.lods[scale] = (None, None, 0)
+            else:
+                vbo = self.ctx.buffer(vertices)
+                vao = self.ctx.vertex_array(
+                    self.prog, [
+                        (vbo, '3f 3f 3f', 'in_vert', 'in_normal', 'in_color')
+                    ])
+                mesh.lods[scale] = (vbo, vao, len(vertices))
+        _, vao, vertex_count = mesh.lods[scale]
+        return (vao, vertex_count)
+    
+    def _release_lods(self, mesh: ChunkMesh):
+        for vbo, vao, _ in mesh.lods.values():
+            if vbo is not None:
+                vao.release()
+                vbo.release()
+        mesh.lods.clear()
+    
+    # read back the queries of the chunk issued at least query_latency frames ago
+    def _read_queries(self, mesh: ChunkMesh):
+        while mesh.queries and self.frame - mesh.queries[0][0] >= query_latency:
+            frame, query = mesh.queries.popleft()
+            mesh.result_frame = frame
+            mesh.samples = query.samples
+            self.free_queries.append(query)
+
+    # the camera is inside or right at the box, its faces may be clipped away
+    def _is_near(self, mesh: ChunkMesh, eye):
+        return bool(numpy.all(eye >= mesh.box_min - near_margin) and 
+                    numpy.all(eye <= mesh.box_max + near_margin))
+
+    def _release(self, key):
+        mesh = self.meshes.pop(key, None)
+        if mesh is not None:
+            self._release_lods(mesh)
+            mesh.vao.release()
+            mesh.vbo.release()
+            self.free_queries.extend(query for _, query in mesh.queries)
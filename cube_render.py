@@ -1,56 +1,93 @@
 import numpy
-from OpenGL import GL
 import moderngl as gl
+from enum import Enum
 from pyrr import Matrix44, Vector3
 from logger import logger
 from scene_generator import KeyActions, unit_size
-from resource_manager import ResourceManger
+from resource_manager import LazyProgram
 from scene_generator import SceneGenerator
 from scene_tracker import SceneTracker
 from scene_objects import SceneObjects
+from instance_buffer import InstanceBuffer
+from edit_journal import EditJournal
+from chunk_render import ChunkRender
+from frustum import Frustum
 
-cube_max_number = 10000
 cube_face_map = {0: (0, 0, unit_size), 1: (unit_size, 0, 0), 
                  2: (0, -unit_size, 0), 3: (-unit_size, 0, 0), 
                  4: (0, 0, -unit_size), 5: (0, unit_size, 0)}
 
+class MeshMode(Enum):
+    Instanced = 0    #36 vertices per cube instance
+    Faces = 1    #exposed faces per chunk
+    Greedy = 2    #exposed faces merged into larger quads
+
 class CubeRender(object):
     def __init__(self,
                  ctx: gl.Context,
-                 tracker: SceneTracker):
+                 tracker: SceneTracker,
+                 journaled = True):
         self.ctx = ctx
         self.tracker = tracker
+        self.journaled = journaled    #off while recording or replaying input, edits stay in memory
+        self.scene_name = "cubes0"    #snapshot the cubes were loaded from, None when streaming
         self.selection = None
+        self.version = 0    #bumped whenever cube geometry changes
+        self.listeners = []    #notified of every cube edit: cube_added, cube_removed, cube_moved, cube_recolored
         self.init_scene()
         self.init_picker()
         self.init_move_map()
         
     def init_scene(self):
-        cube_normals = self.ctx.buffer(SceneGenerator.cube_normals()) 
+        self.cube_normals = self.ctx.buffer(SceneGenerator.cube_normals()) 
         self.cube_pos = self.ctx.buffer(SceneGenerator.cube())
         self.cube_color = None
         
-        self.cubes.extend(SceneObjects.load_cubes("cubes0"))
+        self.journal = EditJournal(self.cubes)
+        self.listeners.append(self.journal)
+        self.cubes.load(SceneObjects.load_cubes(self.scene_name))
+        if self.journaled:
+            self.journal.open(self.scene_name)
         self.tracker.reload(self.cubes)
             
-        self.vbo = self.ctx.buffer(reserve = cube_max_number*24)
-        self.vbo.write(numpy.array(self.cubes).astype('f4'))
-        
-        self.prog = ResourceManger.get_shader('scene')
-        self.vao = self.ctx.vertex_array(
-            self.prog, [
-                (self.cube_pos, '3f /v', 'in_vert'),
-                (cube_normals, '3f /v', 'in_normal'),
-                (self.vbo, '3f 3f /i', 'in_offset', 'in_color')
-            ])
+        self.vbo = InstanceBuffer(self.ctx, 24, self.cube_number)
+        self.vbo.write(self.cubes.instances)
+        self.prog = LazyProgram('scene')    #Instanced mode only
+        self.mesh_mode = MeshMode.Faces
+        self.chunks = ChunkRender(self.ctx, self.cubes)
     
     def init_picker(self):
-        self.prog_pick = ResourceManger.get_shader('scene_pick')
-        self.vao_pick = self.ctx.vertex_array(
-            self.prog_pick, [
-                (self.cube_pos, '3f /v', 'in_vert'),
-                (self.vbo, '3f 12x /i', 'in_offset')
-            ])
+        self.prog_pick = LazyProgram('scene_pick')
+        self.vao = None
+        self.vao_pick = None
+    
+    # drop the vertex arrays of the previous instance buffer, they are
+    # created again on the first draw
+    def bind_instances(self):
+        for vao in (self.vao, self.vao_pick):
+            if vao is not None:
+                vao.release()
+        self.vao = None
+        self.vao_pick = None
+    
+    def scene_vao(self):
+        if self.vao is None:
+            self.vao = self.ctx.vertex_array(
+                self.prog.get(), [
+                    (self.cube_pos, '3f /v', 'in_vert'),
+                    (self.cube_normals, '3f /v', 'in_normal'),
+                    (self.vbo.buffer, '3f 3f /i', 'in_offset', 'in_color')
+                ])
+        return self.vao
+    
+    def pick_vao(self):
+        if self.vao_pick is None:
+            self.vao_pick = self.ctx.vertex_array(
+                self.prog_pick.get(), [
+                    (self.cube_pos, '3f /v', 'in_vert'),
+                    (self.vbo.buffer, '3f 12x /i', 'in_offset')
+                ])
+        return self.vao_pick
     
     def init_move_map(self):
         self.cube_move_map = {
@@ -64,32 +101,62 @@ class CubeRender(object):
         
         
     def reload(self, filename = "cubes0"):
+        self.journal.close()
         self.cubes.clear()
-        self.vbo.clear()
+        self.selection = None
+        self.scene_name = filename
         if filename:
-            self.cubes.extend(SceneObjects.load_cubes(filename))
-            self.vbo.write(numpy.array(self.cubes).astype('f4'))
+            self.cubes.load(SceneObjects.load_cubes(filename))
+            if self.journaled:
+                self.journal.open(filename)
+        if self.vbo.fit(self.cube_number):
+            self.bind_instances()
+        self.vbo.clear()
+        self.vbo.write(self.cubes.instances)
         self.tracker.reload(self.cubes)
+        self.version += 1
+    
+    # edits are journaled as they happen, saving only makes the buffered ones durable
+    def save(self):
+        self.journal.commit()
     
-    def save(self, filename = "cubes0"):
-        SceneObjects.save_cubes(self.cubes, filename)
+    # rewrite the instance buffer after bulk changes of the store (paging)
+    # remapped: {previous id: new id} of the cubes moved or removed (None)
+    def sync_instances(self, remapped = None):
+        if self.vbo.fit(self.cube_number):
+            self.bind_instances()
+        self.vbo.write(self.cubes.instances)
+        if remapped and self.selection in remapped:
+            self.selection = remapped[self.selection]
+        self.version += 1
      
-    def set_projection(self, proj: Matrix44):
-        self.prog['proj'].write(proj.astype('f4'))
-        self.prog_pick['proj'].write(proj.astype('f4'))
+    def set_projection(self, proj: Matrix44, height = None):
+        self.prog.write('proj', proj.astype('f4'))
+        self.prog_pick.write('proj', proj.astype('f4'))
+        self.chunks.set_projection(proj, height)
         
     def update_view(self, mv: Matrix44):
-        self.prog['mv'].write(mv.astype('f4'))
-        self.prog_pick['mv'].write(mv.astype('f4'))
+        self.prog.write('mv', mv.astype('f4'))
+        self.prog_pick.write('mv', mv.astype('f4'))
+        self.chunks.update_view(mv)
     
-    def add_cube(self, x, y, eye):
-        if self.cube_number == cube_max_number:
-            logger.warning(f"Reached the maximum number {cube_max_number}!")
-            return
-        
-        GL.glReadBuffer(GL.GL_COLOR_ATTACHMENT0)
-        pixel = GL.glReadPixels(x, y, 1, 1, GL.GL_RGBA, GL.GL_FLOAT)
-        data = pixel[0][0]
+    def switch_mesh_mode(self):
+        self.mesh_mode = MeshMode((self.mesh_mode.value + 1) % len(MeshMode))
+        if self.mesh_mode != MeshMode.Instanced:
+            self.chunks.set_greedy(self.mesh_mode == MeshMode.Greedy)
+        logger.info(f"Mesh mode: {self.mesh_mode.name}")
+    
+    def switch_lod(self):
+        self.chunks.lod = not self.chunks.lod
+        logger.info(f"Level of detail: {self.chunks.lod}")
+    
+    def switch_occlusion(self):
+        self.chunks.occlusion = not self.chunks.occlusion
+        logger.info(f"Occlusion culling: {self.chunks.occlusion}")
+    
+    # pick: (offset x, offset y, offset z, face id) read from the pick buffer
+    def add_cube(self, pick, eye):
+        data = pick
         face_id = int(data[3])
         if face_id >= 0:
             pos = (data[0] + cube_face_map[face_id][0], 
@@ -105,61 +172,74 @@ class CubeRender(object):
                          numpy.random.uniform(0,1),
                          numpy.random.uniform(0,1))
                   
-            new_cube = [pos[0], pos[1], pos[2], color[0], color[1], color[2]]
-            self.cubes.extend(new_cube)
-            self.vbo.write(numpy.array(new_cube).astype('f4'), 24*(self.cube_number-1))
+            id = self.cubes.add(pos, color)
+            if id is None:
+                return
+            if self.vbo.reserve(self.cube_number):
+                self.bind_instances()
+            self.vbo.write(self.cubes.instances[id:id+1], 24*id)
             self.tracker.add_cube(pos)
+            self.version += 1
+            self._notify('cube_added', pos, tuple(color))
     
-    def remove_cube(self, x, y, eye):
+    def remove_cube(self, pick, eye):
         if self.cube_number <= 0:
             logger.warning("No cubes in the scene!")
             return
         
-        GL.glReadBuffer(GL.GL_COLOR_ATTACHMENT1)
-        data = GL.glReadPixels(x, y, 1, 1, GL.GL_RED, GL.GL_FLOAT)
-        id = int(data[0][0])
-        if id >= 0:
-            del_cube = self.cubes[6*id : 6*id+3]
-            del self.cubes[6*id : 6*(id+1)]
-            self.vbo.write(numpy.array(self.cubes).astype('f4'))
+        id = self.find_picked(pick)
+        if id is not None:
+            del_cube = self.cubes.position(id)
+            moved = self.cubes.remove(id)
+            # the last instance fills the hole, its old range drops out of the draw count
+            if moved is not None:
+                self.vbo.write(self.cubes.instances[id:id+1], 24*id)
             self.tracker.remove_cube(del_cube)
             self.tracker.validate_remove(del_cube, eye)
-            self.selection = None
+            self.version += 1
+            self._notify('cube_removed', tuple(del_cube))
+            if self.selection == id:
+                self.selection = None
+            elif self.selection is not None and self.selection == moved:
+                self.selection = id
     
-    def select_cube(self, x, y):
+    def select_cube(self, pick):
         if self.cube_number <= 0:
             logger.warning("No cubes in the scene!")
             return
         
-        GL.glReadBuffer(GL.GL_COLOR_ATTACHMENT1)
-        data = GL.glReadPixels(x, y, 1, 1, GL.GL_RED, GL.GL_FLOAT)
-        id = int(data[0][0])
-        if id >= 0:
-            self.cubes[6*id+3] = 1.0 - self.cubes[6*id+3]
-            self.cubes[6*id+4] = 1.0 - self.cubes[6*id+4]
-            self.cubes[6*id+5] = 1.0 - self.cubes[6*id+5]
-            highlight = numpy.array(self.cubes[6*id+3 : 6*id+6]).astype('f4')
-            self.vbo.write(highlight, 24*id+12)
-            logger.info("Selection: {:.2f} {:.2f} {:.2f}".format(
-                self.cubes[6*id+0], self.cubes[6*id+1], self.cubes[6*id+2]))
+        id = self.find_picked(pick)
+        if id is not None:
+            self.cubes.set_color(id, 1.0 - self.cubes.color(id))
+            self.vbo.write(self.cubes.instances[id:id+1], 24*id)
+            pos = self.cubes.position(id)
+            self._notify('cube_recolored', tuple(pos), tuple(self.cubes.color(id)))
+            logger.info("Selection: {:.2f} {:.2f} {:.2f}".format(pos[0], pos[1], pos[2]))
             self.selection = id
     
+    # picks are resolved by cube offset rather than instance id, ids may have
+    # been reshuffled by edits applied after the pick was read
+    def find_picked(self, pick):
+        if int(pick[3]) < 0:
+            return None
+        return self.cubes.find(pick[:3])
+    
     def move_step(self, action: KeyActions, eye, front):
         id = self.selection
         if (id is None) or (action not in self.cube_move_map):
             return
         
-        old_pos = Vector3(self.cubes[6*id : 6*id+3])
+        old_pos = Vector3(self.cubes.position(id))
         move_dir = self.decide_move_dir(action, front)
         new_pos = old_pos + move_dir
         
         if self.tracker.validate_movement(old_pos, new_pos, action, eye):
-            self.cubes[6*id] = new_pos[0]
-            self.cubes[6*id+1] = new_pos[1]
-            self.cubes[6*id+2] = new_pos[2]
-            self.vbo.write(numpy.array(new_pos).astype('f4'), 24*id)
+            self.cubes.move(id, new_pos)
+            self.vbo.write(self.cubes.instances[id:id+1], 24*id)
             self.tracker.remove_cube(old_pos)
             self.tracker.add_cube(new_pos)
+            self.version += 1
+            self._notify('cube_moved', tuple(old_pos), tuple(new_pos))
     
     def decide_move_dir(self, action: KeyActions, front):
         front_x, front_y = front[0], front[1]
@@ -171,10 +251,13 @@ class CubeRender(object):
         return unit_size * self.cube_move_map[action](dir)
     
     def render_picker(self):
-        self.vao_pick.render(gl.TRIANGLES, instances=self.cube_number)
+        self.pick_vao().render(gl.TRIANGLES, instances=self.cube_number)
         
-    def render(self):
-        self.vao.render(gl.TRIANGLES, instances=self.cube_number)
+    def render(self, frustum: Frustum = None, eye = None):
+        if self.mesh_mode == MeshMode.Instanced:
+            self.scene_vao().render(gl.TRIANGLES, instances=self.cube_number)
+        else:
+            self.chunks.render(frustum, eye)
     
     @property
     def cubes(self):
@@ -182,4 +265,8 @@ class CubeRender(object):
     
     @property
     def cube_number(self):
-        return int(len(self.cubes) / 6)
\ No newline at end of file
+        return len(self.cubes)
+    
+    def _notify(self, event, *args):
+        for listener in self.listeners:
+            getattr(listener, event)(*args)
\ No newline at end of file
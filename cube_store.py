@@ -0,0 +1,264 @@
+import numpy
+from scene_generator import unit_size, half_unit
+
+# static cubes are grouped into chunks of chunk_size^3 grid cells
+chunk_size = 16
+# cells from a chunk border whose edits also drop the coarse meshes of the
+# neighbour, the largest level of detail scale (chunk_render.lod_scales)
+lod_margin = 4
+
+# one record per cube, same layout as the cube instance VBO ('3f 3f /i')
+cube_dtype = numpy.dtype([('pos', 'f4', 3), ('color', 'f4', 3)])
+
+# grid index of cube offsets, same rounding as Grid3D.offset_3d_to_index
+def offsets_to_cells(offsets):
+    offsets = numpy.asarray(offsets, dtype='f8') / unit_size
+    half = half_unit / unit_size
+    cells = numpy.where(offsets >= 0, numpy.floor(offsets + half), numpy.ceil(offsets - half))
+    return cells.astype('i4')
+
+def offset_to_cell(offset):
+    return tuple(int((o+half_unit)/unit_size) if o>=0 else int((o-half_unit)/unit_size)
+                 for o in offset[:3])
+
+def cell_to_chunk(cell):
+    return (cell[0] // chunk_size, cell[1] // chunk_size, cell[2] // chunk_size)
+
+def cell_to_local(cell):
+    return (cell[0] % chunk_size, cell[1] % chunk_size, cell[2] % chunk_size)
+
+class CubeChunk(object):
+    def __init__(self, key):
+        self.key = key
+        self.origin = (key[0]*chunk_size, key[1]*chunk_size, key[2]*chunk_size)
+        # cube id of every cell in the chunk, -1 for empty cells
+        self.slots = numpy.full((chunk_size, chunk_size, chunk_size), -1, dtype='i4')
+        self.count = 0
+
+    @property
+    def occupancy(self):
+        return self.slots >= 0
+
+# Cube records live in one dense structured array (the instance table) and
+# every occupied cell is indexed by the chunk it falls in.
+class CubeStore(object):
+    def __init__(self, capacity = 1024):
+        self.data = numpy.zeros(capacity, dtype=cube_dtype)
+        self.count = 0
+        self.chunks = dict()
+        self.dirty = set()    #chunks whose cubes changed since the last mesh update
+        self.lod_dirty = set()    #chunks whose coarse meshes may be stale, see _mark_dirty
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for id in range(self.count):
+            yield self.data[id]
+
+    @property
+    def instances(self):
+        return self.data[:self.count]
+
+    def iter_chunks(self):
+        return iter(self.chunks.values())
+
+    def clear(self):
+        self.dirty.update(self.chunks.keys())
+        self.count = 0
+        self.chunks.clear()
+
+    def reserve(self, capacity):
+        if capacity > len(self.data):
+            data = numpy.zeros(max(capacity, 2*len(self.data)), dtype=cube_dtype)
+            data[:self.count] = self.data[:self.count]
+            self.data = data
+
+    def load(self, cubes):
+        self.clear()
+        self.insert(cubes)
+
+    # bulk add, keeping the first cube of every free cell in the given order
+    # return the number of cubes added
+    def insert(self, cubes):
+        cubes = numpy.asarray(cubes, dtype=cube_dtype).reshape(-1)
+        if len(cubes) == 0:
+            return 0
+
+        cells = offsets_to_cells(cubes['pos'])
+        _, first = numpy.unique(cells, axis=0, return_index=True)
+        first.sort()
+        cubes, cells = cubes[first], cells[first]
+
+        # group the cubes by chunk
+        local = cells % chunk_size
+        chunk_keys, inverse = numpy.unique(cells // chunk_size, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = numpy.argsort(inverse, kind='stable')
+        bounds = numpy.searchsorted(inverse[order], numpy.arange(len(chunk_keys)+1))
+        groups = [(key, order[bounds[i]:bounds[i+1]])
+                  for i, key in enumerate(map(tuple, chunk_keys.tolist()))]
+
+        free = numpy.ones(len(cubes), dtype=bool)
+        for key, rows in groups:
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                free[rows] = chunk.slots[local[rows, 0], local[rows, 1], local[rows, 2]] < 0
+
+        added = int(free.sum())
+        ids = numpy.full(len(cubes), -1, dtype='i4')
+        ids[free] = numpy.arange(self.count, self.count+added)
+        self.reserve(self.count + added)
+        self.data[self.count:self.count+added] = cubes[free]
+        self.count += added
+
+        for key, rows in groups:
+            rows = rows[free[rows]]
+            if len(rows) == 0:
+                continue
+            chunk, _ = self._locate(self._chunk_cell(key), create=True)
+            chunk.slots[local[rows, 0], local[rows, 1], local[rows, 2]] = ids[rows]
+            chunk.count += len(rows)
+            self._mark_chunk_dirty(key)
+        return added
+
+    # remove every cube of a chunk
+    # return {previous id: new id} of the cubes that moved or were removed (None)
+    def remove_chunk(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return {}
+        # highest ids first, so swap-and-pop never moves a cube of this chunk
+        ids = numpy.sort(chunk.slots[chunk.slots >= 0])[::-1].tolist()
+        remapped = dict()
+        previous = dict()    #current id: previous id of the cubes moved so far
+        for id in ids:
+            remapped[previous.pop(id, id)] = None
+            moved = self.remove(id)
+            if moved is not None:
+                origin = previous.pop(moved, moved)
+                remapped[origin] = id
+                previous[id] = origin
+        return remapped
+
+    # remapping of first followed by second, same form as remove_chunk
+    @classmethod
+    def compose_remap(cls, first, second):
+        composed = dict(first)
+        images = {new: old for old, new in first.items() if new is not None}
+        for id, new in second.items():
+            composed[images.get(id, id)] = new
+        return composed
+
+    def chunk_cubes(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return numpy.zeros(0, dtype=cube_dtype)
+        return self.data[numpy.sort(chunk.slots[chunk.slots >= 0])]
+
+    def find(self, pos):
+        chunk, local = self._locate(offset_to_cell(pos))
+        if chunk is None:
+            return None
+        id = chunk.slots[local]
+        return int(id) if id >= 0 else None
+
+    def add(self, pos, color):
+        cell = offset_to_cell(pos)
+        chunk, local = self._locate(cell, create=True)
+        if chunk.slots[local] >= 0:
+            return None
+
+        self.reserve(self.count + 1)
+        id = self.count
+        self.data[id] = (pos[:3], color[:3])
+        chunk.slots[local] = id
+        chunk.count += 1
+        self.count += 1
+        self._mark_dirty(cell)
+        return id
+
+    # swap-and-pop: the last cube moves into the freed id
+    # return the previous id of the moved cube, None if nothing moved
+    def remove(self, id):
+        last = self.count - 1
+        self._release(offset_to_cell(self.data['pos'][id]))
+        self.count = last
+        if id == last:
+            return None
+
+        self.data[id] = self.data[last]
+        chunk, local = self._locate(offset_to_cell(self.data['pos'][id]))
+        chunk.slots[local] = id
+        return last
+
+    def move(self, id, pos):
+        cell = offset_to_cell(pos)
+        if self.find(pos) is not None:
+            return False
+
+        self._release(offset_to_cell(self.data['pos'][id]))
+        chunk, local = self._locate(cell, create=True)
+        chunk.slots[local] = id
+        chunk.count += 1
+        self.data['pos'][id] = pos[:3]
+        self._mark_dirty(cell)
+        return True
+
+    def position(self, id):
+        return self.data['pos'][id].astype('f8')
+
+    def color(self, id):
+        return self.data['color'][id].astype('f8')
+
+    def set_color(self, id, color):
+        self.data['color'][id] = color[:3]
+        self.dirty.add(cell_to_chunk(offset_to_cell(self.data['pos'][id])))
+
+    def cells(self):
+        return offsets_to_cells(self.instances['pos'])
+
+    def _locate(self, cell, create = False):
+        key = cell_to_chunk(cell)
+        chunk = self.chunks.get(key)
+        if chunk is None and create:
+            chunk = self.chunks[key] = CubeChunk(key)
+        return (chunk, cell_to_local(cell))
+
+    def _release(self, cell):
+        chunk, local = self._locate(cell)
+        chunk.slots[local] = -1
+        chunk.count -= 1
+        if chunk.count == 0:
+            del self.chunks[chunk.key]
+        self._mark_dirty(cell)
+
+    @classmethod
+    def _chunk_cell(cls, key):
+        return (key[0]*chunk_size, key[1]*chunk_size, key[2]*chunk_size)
+
+    def _mark_chunk_dirty(self, key):
+        self.dirty.add(key)
+        for axis in range(3):
+            for side in (-1, 1):
+                neighbor = list(key)
+                neighbor[axis] += side
+                self.dirty.add(tuple(neighbor))
+
+    # a cell on the chunk border also changes which faces of the neighbour are
+    # visible; coarse meshes are only built on use, so the neighbour's are
+    # dropped for any cell within lod_margin of the border
+    def _mark_dirty(self, cell):
+        key = cell_to_chunk(cell)
+        local = cell_to_local(cell)
+        self.dirty.add(key)
+        for axis in range(3):
+            side = -1 if local[axis] < lod_margin else (1 if local[axis] >= chunk_size-lod_margin else 0)
+            if side == 0:
+                continue
+            neighbor = list(key)
+            neighbor[axis] += side
+            if local[axis] in (0, chunk_size-1):
+                self.dirty.add(tuple(neighbor))
+            else:
+                self.lod_dirty.add(tuple(neighbor))
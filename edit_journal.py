@@ -0,0 +1,222 @@
+import os
+import struct
+import threading
+import time
+import numpy
+from enum import Enum
+from logger import logger
+from resource_manager import ResourceManger
+from cube_store import CubeStore
+from scene_file import SceneFile, binary_ext
+
+# Journal file: magic, version, generation, then fixed size edit records
+# appended in order. A torn record at the end (crash while writing) is dropped
+# on replay.
+journal_magic = b'CUBEJRN\0'
+journal_version = 1
+journal_header_format = '<8sII'
+journal_ext = '.journal'
+compacting_ext = '.compacting'
+journal_dtype = numpy.dtype([('op', 'u1'), ('pad', 'u1', 3), ('pos', '<f4', 3), ('arg', '<f4', 3)])
+
+class JournalOp(Enum):
+    Add = 1    #arg: color
+    Remove = 2
+    Move = 3    #arg: new position
+    Recolor = 4    #arg: color
+
+# Append-only log of the cube edits of a scene on top of its snapshot
+# (the binary scene file). Edits are buffered and made durable in batches,
+# one fsync per sync_batch edits or sync_interval seconds. Once the journal
+# holds compact_records edits, the store is written as a new snapshot on a
+# background thread and the journal starts over.
+# Journals are numbered by generation and the snapshot header records the
+# first generation it does not contain, so on open the journals the snapshot
+# already covers are skipped (e.g. after a crash between replacing the
+# snapshot and deleting the compacting journal) and the others are replayed
+# in order: scene state = snapshot + compacting journal (if any) + journal.
+class EditJournal(object):
+    def __init__(self,
+                 store: CubeStore,
+                 sync_batch = 64,
+                 sync_interval = 1.0,
+                 compact_records = 4096):
+        self.store = store
+        self.sync_batch = sync_batch
+        self.sync_interval = sync_interval
+        self.compact_records = compact_records
+        self.name = None
+        self.file = None
+        self.pending = []
+        self.records = 0    #edits since the last snapshot
+        self.generation = 0    #generation of the current journal
+        self.last_sync = time.perf_counter()
+        self.compactor = None
+
+    # replay the journal of the scene on top of the loaded snapshot, then append to it
+    # return the number of edits replayed
+    def open(self, name: str):
+        self.close()
+        self.name = name
+        snapshot_path = self._path(binary_ext)
+        snapshot_generation = SceneFile.generation(snapshot_path) if os.path.exists(snapshot_path) else 0
+        self.generation = snapshot_generation
+        replayed = 0
+        unfinished = False
+        for file_path in (self._path(compacting_ext), self._path(journal_ext)):
+            if not os.path.exists(file_path):
+                continue
+            generation, records = self.read(file_path)
+            if generation < snapshot_generation:
+                os.remove(file_path)    #already in the snapshot
+                continue
+            replayed += self.replay(self.store, records)
+            self.generation = max(self.generation, generation)
+            unfinished |= file_path == self._path(compacting_ext)
+        if unfinished:
+            # the last compaction did not finish, fold both journals into a new snapshot
+            self.generation += 1
+            self._write_snapshot(self.store.instances.copy(), snapshot_path, self.generation,
+                                 (self._path(compacting_ext), self._path(journal_ext)))
+        self.file = self._open_journal(self._path(journal_ext), self.generation)
+        self.records = (os.path.getsize(self._path(journal_ext)) - struct.calcsize(journal_header_format)) \
+            // journal_dtype.itemsize
+        if replayed:
+            logger.info(f"Replayed {replayed} edits of {name}")
+        return replayed
+
+    def close(self):
+        if self.file is not None:
+            self.commit()
+            self.file.close()
+            self.file = None
+        if self.compactor is not None:
+            self.compactor.join()
+            self.compactor = None
+        self.name = None
+
+    # call once per frame, syncs and compacts when due
+    def update(self):
+        if self.file is None:
+            return
+        if self.pending and (len(self.pending) >= self.sync_batch or
+                             time.perf_counter() - self.last_sync >= self.sync_interval):
+            self.commit()
+        if self.records >= self.compact_records:
+            self.compact()
+
+    # write and fsync the buffered edits
+    def commit(self):
+        self.last_sync = time.perf_counter()
+        if self.file is None or not self.pending:
+            return
+        self.file.write(numpy.concatenate(self.pending).tobytes())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending.clear()
+
+    # start a new journal, the current one is folded into a snapshot in the background
+    def compact(self):
+        if self.file is None or (self.compactor is not None and self.compactor.is_alive()):
+            return
+        self.commit()
+        self.file.close()
+        journal_path, compacting_path = self._path(journal_ext), self._path(compacting_ext)
+        os.replace(journal_path, compacting_path)
+        self.generation += 1
+        self.file = self._open_journal(journal_path, self.generation)
+        self.records = 0
+        self.compactor = threading.Thread(target=self._write_snapshot,
+                                          args=(self.store.instances.copy(), self._path(binary_ext),
+                                                self.generation, (compacting_path,)))
+        self.compactor.start()
+
+    # CubeRender edit listener
+    def cube_added(self, pos, color):
+        self._append(JournalOp.Add, pos, color)
+
+    def cube_removed(self, pos):
+        self._append(JournalOp.Remove, pos)
+
+    def cube_moved(self, old_pos, new_pos):
+        self._append(JournalOp.Move, old_pos, new_pos)
+
+    def cube_recolored(self, pos, color):
+        self._append(JournalOp.Recolor, pos, color)
+
+    # (generation, records) of a journal file
+    @classmethod
+    def read(cls, file_path: str):
+        with open(file_path, 'rb') as file:
+            header = file.read(struct.calcsize(journal_header_format))
+            if len(header) < struct.calcsize(journal_header_format):
+                return (0, numpy.zeros(0, dtype=journal_dtype))
+            file_magic, file_version, generation = struct.unpack(journal_header_format, header)
+            if file_magic != journal_magic:
+                raise ValueError(f"Not a journal file: {file_path}")
+            if file_version > journal_version:
+                raise ValueError(f"Unsupported journal version {file_version}: {file_path}")
+            data = file.read()
+        count = len(data) // journal_dtype.itemsize
+        if count * journal_dtype.itemsize != len(data):
+            logger.warning(f"Dropped a torn record at the end of {file_path}")
+        return (generation, numpy.frombuffer(data[:count*journal_dtype.itemsize], dtype=journal_dtype))
+
+    # apply journal records to the store in order
+    @classmethod
+    def replay(cls, store: CubeStore, records):
+        for op, pos, arg in zip(records['op'].tolist(), records['pos'].tolist(), records['arg'].tolist()):
+            op = JournalOp(op)
+            if op == JournalOp.Add:
+                store.add(pos, arg)
+                continue
+            id = store.find(pos)
+            if id is None:
+                continue
+            if op == JournalOp.Remove:
+                store.remove(id)
+            elif op == JournalOp.Move:
+                store.move(id, arg)
+            elif op == JournalOp.Recolor:
+                store.set_color(id, arg)
+        return len(records)
+
+    def _append(self, op: JournalOp, pos, arg = (0.0, 0.0, 0.0)):
+        if self.file is None:
+            return
+        record = numpy.zeros(1, dtype=journal_dtype)
+        record['op'] = op.value
+        record['pos'] = pos
+        record['arg'] = arg
+        self.pending.append(record)
+        self.records += 1
+
+    def _path(self, ext):
+        return ResourceManger.get_data_file(self.name + ext)
+
+    # a torn record at the end is cut off so appends stay aligned
+    def _open_journal(self, file_path, generation):
+        file = open(file_path, 'ab')
+        header_size = struct.calcsize(journal_header_format)
+        size = file.tell()
+        if size < header_size:
+            file.truncate(0)
+            file.write(struct.pack(journal_header_format, journal_magic, journal_version, generation))
+        elif (size - header_size) % journal_dtype.itemsize:
+            file.truncate(size - (size - header_size) % journal_dtype.itemsize)
+        file.flush()
+        os.fsync(file.fileno())
+        return file
+
+    # the snapshot is replaced atomically, then the folded journals are dropped
+    def _write_snapshot(self, records, snapshot_path, generation, folded_paths):
+        start = time.perf_counter()
+        temp_path = snapshot_path + '.tmp'
+        SceneFile.write(temp_path, records, generation)
+        with open(temp_path, 'rb+') as file:
+            os.fsync(file.fileno())
+        os.replace(temp_path, snapshot_path)
+        for file_path in folded_paths:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        logger.info(f"Compacted {snapshot_path}: {len(records)} cubes in {time.perf_counter()-start:.3f}s")
@@ -0,0 +1,99 @@
+import time
+import numpy
+import moderngl as gl
+from collections import deque
+from contextlib import contextmanager
+
+# frames between ending a timer query and reading its result
+timer_latency = 3
+
+# Per-stage CPU and GPU times of the last `window` frames. Every stage runs
+# inside a GL_TIME_ELAPSED query taken from a pool, the results are read a
+# few frames later so reading them does not wait for the GPU. A stage that
+# did not run in a frame (e.g. the pick pass) has no sample for it.
+class FrameProfiler(object):
+    def __init__(self,
+                 ctx: gl.Context,
+                 stages,
+                 window = 600):
+        self.ctx = ctx
+        self.stages = tuple(stages)
+        self.index = {stage: i for i, stage in enumerate(self.stages)}
+        self.window = window
+        self.frame = 0
+        self.frame_ms = numpy.full(window, numpy.nan)    #interval between frame ends
+        self.cpu_ms = numpy.full((window, len(self.stages)), numpy.nan)
+        self.gpu_ms = numpy.full((window, len(self.stages)), numpy.nan)
+        self.current = numpy.full(len(self.stages), numpy.nan)
+        self.pending = deque()    #(frame, stage index, query)
+        self.free_queries = []
+        self.last_end = None
+
+    @contextmanager
+    def stage(self, name: str):
+        index = self.index[name]
+        query = self.free_queries.pop() if self.free_queries else self.ctx.query(time=True)
+        start = time.perf_counter()
+        with query:
+            yield
+        elapsed = (time.perf_counter() - start) * 1000.0
+        self.current[index] = numpy.nan_to_num(self.current[index]) + elapsed
+        self.pending.append((self.frame, index, query))
+
+    # call once per frame after the last stage
+    def end_frame(self):
+        row = self.frame % self.window
+        now = time.perf_counter()
+        self.frame_ms[row] = (now - self.last_end) * 1000.0 if self.last_end is not None else numpy.nan
+        self.last_end = now
+        self.cpu_ms[row] = self.current
+        self.gpu_ms[row] = numpy.nan
+        self.current = numpy.full(len(self.stages), numpy.nan)
+
+        while self.pending and self.frame - self.pending[0][0] >= timer_latency:
+            frame, index, query = self.pending.popleft()
+            if self.frame - frame < self.window:
+                elapsed = query.elapsed / 1e6
+                row = frame % self.window
+                self.gpu_ms[row, index] = numpy.nan_to_num(self.gpu_ms[row, index]) + elapsed
+            self.free_queries.append(query)
+        self.frame += 1
+
+    # {stage: (cpu p50, p95, p99, gpu p50, p95, p99)} in ms, 'frame' for the frame interval
+    def percentiles(self, q = (50, 95, 99)):
+        count = min(self.frame, self.window)
+        # GPU samples of the newest frames are not read back yet
+        gpu_count = max(count - timer_latency, 0)
+        rows = (self.frame - 1 - numpy.arange(count)) % self.window
+        gpu_rows = rows[timer_latency:timer_latency + gpu_count]
+        stats = {'frame': self._percentiles(self.frame_ms[rows], q) + (numpy.nan,) * len(q)}
+        for stage, i in self.index.items():
+            stats[stage] = (self._percentiles(self.cpu_ms[rows, i], q) +
+                            self._percentiles(self.gpu_ms[gpu_rows, i], q))
+        return stats
+
+    # text lines of the percentiles for the overlay
+    def report(self):
+        lines = ["stage      cpu p50/p95/p99   gpu p50/p95/p99"]
+        for stage, values in self.percentiles().items():
+            lines.append("{:<8} {:>5.2f}/{:>5.2f}/{:>5.2f}  {:>5.2f}/{:>5.2f}/{:>5.2f}".format(stage, *values)
+                         .replace("nan", "  -"))
+        return lines
+
+    # one row per recorded frame, oldest first: frame, frame ms, cpu ms per stage, gpu ms per stage
+    def export_csv(self, file_path: str):
+        count = min(self.frame, self.window)
+        rows = (self.frame - count + numpy.arange(count)) % self.window
+        frames = numpy.arange(self.frame - count, self.frame)
+        table = numpy.column_stack([frames, self.frame_ms[rows], self.cpu_ms[rows], self.gpu_ms[rows]])
+        header = ",".join(["frame", "frame_ms"] + [f"{stage}_cpu_ms" for stage in self.stages] +
+                          [f"{stage}_gpu_ms" for stage in self.stages])
+        numpy.savetxt(file_path, table, delimiter=',', fmt=['%d'] + ['%.4f'] * (table.shape[1] - 1),
+                      header=header, comments='')
+
+    @classmethod
+    def _percentiles(cls, samples, q):
+        samples = samples[numpy.isfinite(samples)]
+        if len(samples) == 0:
+            return (numpy.nan,) * len(q)
+        return tuple(numpy.percentile(samples, q).tolist())
@@ -0,0 +1,30 @@
+import numpy
+from pyrr import Matrix44
+
+# View frustum planes extracted from the projection and look-at matrices.
+# pyrr matrices transform row vectors (clip = pos * view * proj), so the
+# planes come from the columns of view * proj.
+class Frustum(object):
+    def __init__(self, proj: Matrix44, view: Matrix44):
+        m = numpy.asarray(view, dtype='f8') @ numpy.asarray(proj, dtype='f8')
+        planes = numpy.array([
+            m[:, 3] + m[:, 0],   #left
+            m[:, 3] - m[:, 0],   #right
+            m[:, 3] + m[:, 1],   #bottom
+            m[:, 3] - m[:, 1],   #top
+            m[:, 3] + m[:, 2],   #near
+            m[:, 3] - m[:, 2]])  #far
+        self.planes = planes / numpy.linalg.norm(planes[:, :3], axis=1)[:, None]
+
+    # boxes given as (n, 3) min and max corners, True for boxes at least partly inside
+    def boxes_visible(self, box_min, box_max):
+        box_min = numpy.asarray(box_min, dtype='f8').reshape(-1, 3)
+        box_max = numpy.asarray(box_max, dtype='f8').reshape(-1, 3)
+        normals = self.planes[:, :3]
+        # corner of every box furthest along each plane normal, shape (n, 6, 3)
+        corners = numpy.where(normals[None, :, :] >= 0, box_max[:, None, :], box_min[:, None, :])
+        distances = (corners * normals[None, :, :]).sum(axis=2) + self.planes[:, 3]
+        return (distances >= 0).all(axis=1)
+
+    def box_visible(self, box_min, box_max):
+        return bool(self.boxes_visible(box_min, box_max)[0])
@@ -1,7 +1,7 @@
 import numpy
 import moderngl as gl
 from pyrr import Matrix44
-from resource_manager import ResourceManger
+from resource_manager import ResourceManger, LazyProgram
 from scene_generator import SceneGenerator
 from scene_generator import ground_width
 
@@ -19,14 +19,14 @@ class GroundRender():
         self.vao = self.ctx.vertex_array(self.prog, vbo, 'in_vert')
     
     def init_picker(self):
-        self.prog_pick = ResourceManger.get_shader('ground_pick')
-        vbo = self.ctx.buffer(numpy.array([
+        self.prog_pick = LazyProgram('ground_pick')
+        self.vbo_pick = self.ctx.buffer(numpy.array([
             -ground_width, ground_width, 0, 0, 1,
             -ground_width, -ground_width, 0,  0, 0, 
             ground_width, ground_width, 0, 1, 1,
             ground_width, -ground_width, 0, 1, 0
             ]).astype('f4'))
-        self.vao_pick = self.ctx.vertex_array(self.prog_pick, vbo, 'in_vert', 'in_texCoord')
+        self.vao_pick = None    #created on the first pick
         
         # generate texture for pick up
         width = int(ground_width*2)
@@ -37,13 +37,16 @@ class GroundRender():
     
     def set_projection(self, proj: Matrix44):
         self.prog['proj'].write(proj.astype('f4'))
-        self.prog_pick['proj'].write(proj.astype('f4'))
+        self.prog_pick.write('proj', proj.astype('f4'))
         
     def update_view(self, mv: Matrix44):
         self.prog['mv'].write(mv.astype('f4'))
-        self.prog_pick['mv'].write(mv.astype('f4'))
+        self.prog_pick.write('mv', mv.astype('f4'))
     
     def render_picker(self):
+        if self.vao_pick is None:
+            self.vao_pick = self.ctx.vertex_array(self.prog_pick.get(), self.vbo_pick, 'in_vert', 'in_texCoord')
+        self.texture.use(0)
         self.vao_pick.render(gl.TRIANGLE_STRIP)
         
     def render(self):
@@ -0,0 +1,139 @@
+import sys
+from startup_profile import StartupProfile
+startup = StartupProfile(trace_imports = '--startup-profile' in sys.argv)
+
+import argparse
+import os
+import time
+import numpy
+import moderngl as gl
+import moderngl_window as glw
+from logger import logger
+from moderngl_window.conf import settings
+from resource_manager import ResourceManger
+from scene_builder import SceneBuilder
+from physics_stepper import PhysicsStepper
+from input_recorder import InputReplayer, replay_keys, write_trace
+startup.mark('imports')
+
+# Offscreen benchmark: renders a fixed number of frames into the headless
+# window's framebuffer with a fixed simulation step, no vsync and no input,
+# and reports the wall time of every frame (render + glFinish).
+# With --replay, the frames and input events come from an input log instead.
+#   python headless.py --frames 600 --software
+#   python headless.py --replay maze.input --trace maze.csv
+#   python headless.py --live-cubes 5000 --csv live5000.csv
+#   python headless.py --frames 1 --cold    (shader compile times without the driver cache)
+parser = argparse.ArgumentParser(description="Cubes headless benchmark")
+parser.add_argument('--frames', type=int, default=600, help="frames to render")
+parser.add_argument('--warmup', type=int, default=30, help="frames rendered before timing starts")
+parser.add_argument('--size', default="1352x815", help="framebuffer size, WIDTHxHEIGHT")
+parser.add_argument('--backend', default=None, help="context backend, e.g. egl")
+parser.add_argument('--software', action='store_true', help="force the Mesa llvmpipe rasteriser")
+parser.add_argument('--cold', action='store_true', help="disable the driver's shader disk cache")
+parser.add_argument('--compile-all', action='store_true', help="compile every program before the first frame")
+parser.add_argument('--world', help="region file to stream the scene from")
+parser.add_argument('--live-cubes', type=int, default=0, help="random live cube paths added to the scene")
+parser.add_argument('--physics-rate', type=float, default=120.0, help="physics steps per second")
+parser.add_argument('--csv', help="write the per-frame timings to this file")
+parser.add_argument('--replay', help="input log recorded with application.py --record")
+parser.add_argument('--trace', help="write frame timings, eye positions and cube counts of a replay")
+parser.add_argument('--startup-profile', action='store_true', help="log import and init times up to the first frame")
+parser.add_argument('--profile', help="write the per-stage CPU/GPU timings of the last frames to this file")
+args = parser.parse_args()
+replayer = InputReplayer(args.replay) if args.replay else None
+
+if args.software:
+    os.environ['LIBGL_ALWAYS_SOFTWARE'] = '1'
+    os.environ['GALLIUM_DRIVER'] = 'llvmpipe'
+if args.cold:
+    os.environ['MESA_SHADER_CACHE_DISABLE'] = 'true'
+    os.environ['__GL_SHADER_DISK_CACHE'] = '0'
+
+# Create offscreen window
+width, height = map(int, args.size.lower().split('x'))
+if replayer is not None:
+    width, height = replayer.size    #picks depend on the window size
+    args.frames, args.warmup = replayer.frames, 0
+settings.WINDOW = {
+    "class": "moderngl_window.context.headless.Window",
+    "gl_version": (3, 3),
+    "size": (width, height),
+    "aspect_ratio": None,
+    "vsync": False
+}
+if args.backend:
+    settings.WINDOW["backend"] = args.backend
+window = glw.create_window_from_settings()
+startup.mark('window')
+
+# OpenGL context configuration
+ctx = window.ctx
+ctx.enable(gl.DEPTH_TEST | gl.CULL_FACE)
+logger.info(f"Renderer: {ctx.info['GL_RENDERER']}")
+
+# Load OpenGL resource
+ResourceManger.initialize()
+ResourceManger.load_all_resources()
+if args.compile_all:
+    ResourceManger.compile_all()
+startup.mark('resources')
+
+window.keys = replay_keys(window.keys)
+cube_builder = SceneBuilder(window, journaled = replayer is None)
+cube_builder.physics = PhysicsStepper(args.physics_rate)
+if args.world:
+    cube_builder.stream(args.world)
+if args.live_cubes:
+    cube_builder.live_cubes.add_random_cubes(args.live_cubes)
+if replayer is not None:
+    replayer.load_scene(cube_builder)
+    replayer.start()
+startup.mark('scene')
+
+frame_time = 1.0 / 60.0
+timings = numpy.zeros(args.frames)
+trace = []
+for frame in range(args.warmup + args.frames):
+    start = time.perf_counter()
+    if replayer is not None:
+        current_time, delta = replayer.next_frame(frame, window, cube_builder)
+    else:
+        current_time, delta = frame * frame_time, frame_time
+    window.clear(0.2, 0.2, 0.2, 1.0)
+    cube_builder.render(current_time, delta)
+    window.swap_buffers()
+    if frame == 0:
+        ctx.finish()
+        startup.first_frame()
+        startup.close()
+    if frame < args.warmup:
+        continue
+    timings[frame - args.warmup] = time.perf_counter() - start
+    if args.trace:
+        eye = cube_builder.camera.position
+        trace.append((frame, timings[frame - args.warmup] * 1000.0, eye[0], eye[1], eye[2],
+                      cube_builder.scene.cube_number))
+
+for line in cube_builder.profiler.report():
+    logger.info(line)
+ResourceManger.log_load_times()
+for line in startup.report() if args.startup_profile else startup.report()[-1:]:
+    logger.info(line)
+if args.profile:
+    cube_builder.export_profile(args.profile)
+live_count = cube_builder.live_cubes.cube_number
+cube_builder.close()
+window.destroy()
+
+ms = timings * 1000.0
+logger.info(
+    "{0} frames @ {1}x{2}: mean {3:.2f}ms, median {4:.2f}ms, p95 {5:.2f}ms, p99 {6:.2f}ms, "
+    "max {7:.2f}ms, {8:.1f} FPS, {9} live cubes".format(
+        args.frames, width, height, ms.mean(), numpy.median(ms),
+        numpy.percentile(ms, 95), numpy.percentile(ms, 99), ms.max(), 1000.0 / ms.mean(),
+        live_count))
+if args.csv:
+    numpy.savetxt(args.csv, ms, fmt="%.3f", header="frame_ms", comments="")
+if args.trace:
+    write_trace(args.trace, trace)
@@ -0,0 +1,169 @@
+import json
+import numpy
+from collections import defaultdict
+from moderngl_window import BaseWindow
+from moderngl_window.context.base import BaseKeys
+from logger import logger
+from scene_builder import SceneBuilder
+
+# Input log: JSON lines, a header with the time step, random seed and the
+# scene the recording starts from (snapshot name or region file), then
+# one line per input event tagged with the frame it was handled before, then
+# the number of recorded frames. Keys are logged by name, so a log recorded
+# on one window backend replays on another.
+record_version = 2
+input_events = ('key_event', 'mouse_press', 'mouse_release', 'mouse_drag',
+                'mouse_scroll', 'mouse_position')
+
+# key namespace with distinct codes for windows that have no keyboard (headless)
+def replay_keys(keys):
+    if keys.W != BaseKeys.W:
+        return keys
+    names = [name for name in vars(BaseKeys) if name.isupper() and not name.startswith('ACTION')]
+    codes = {name: code for code, name in enumerate(names)}
+    codes['ACTION_PRESS'] = BaseKeys.ACTION_PRESS
+    codes['ACTION_RELEASE'] = BaseKeys.ACTION_RELEASE
+    return type('ReplayKeys', (BaseKeys,), codes)
+
+# Stands in for the SceneBuilder event handlers of the window, logs every
+# event and forwards it. The simulation runs on a fixed time step while
+# recording, so a replay steps through exactly the same states.
+class InputRecorder(object):
+    def __init__(self,
+                 file_path: str,
+                 wnd: BaseWindow,
+                 builder: SceneBuilder,
+                 time_step = 1.0/60.0,
+                 seed = 0):
+        self.wnd = wnd
+        self.builder = builder
+        self.time_step = time_step
+        self.frame = 0
+        self.key_names = {getattr(wnd.keys, name): name for name in vars(BaseKeys)
+                          if name.isupper()}
+        numpy.random.seed(seed)
+        self.file = open(file_path, 'w')
+        pager = builder.pager
+        self._write({'version': record_version, 'time_step': time_step,
+                     'seed': seed, 'size': list(wnd.size),
+                     'scene': builder.scene.scene_name,
+                     'world': pager.region_file.file_path if pager is not None else None})
+        for event in input_events:
+            setattr(wnd, event + '_func', getattr(self, event))
+
+    # (time, frame time) of the next frame
+    def next_frame(self):
+        time = self.frame * self.time_step
+        self.frame += 1
+        return (time, self.time_step)
+
+    def close(self):
+        self._write({'frames': self.frame})
+        self.file.close()
+        logger.info(f"Recorded {self.frame} frames")
+
+    def key_event(self, key, action, modifiers):
+        self._log('key_event', self.key_names.get(key, key), self.key_names.get(action, action))
+        self.builder.key_event(key, action, modifiers)
+
+    def mouse_press(self, x, y, button):
+        self._log('mouse_press', x, y, button)
+        self.builder.mouse_press(x, y, button)
+
+    def mouse_release(self, x, y, button):
+        self._log('mouse_release', x, y, button)
+        self.builder.mouse_release(x, y, button)
+
+    def mouse_drag(self, x, y, dx, dy):
+        self._log('mouse_drag', x, y, dx, dy)
+        self.builder.mouse_drag(x, y, dx, dy)
+
+    def mouse_scroll(self, x_offset, y_offset):
+        self._log('mouse_scroll', x_offset, y_offset)
+        self.builder.mouse_scroll(x_offset, y_offset)
+
+    def mouse_position(self, x, y, dx, dy):
+        self._log('mouse_position', x, y, dx, dy)
+        self.builder.mouse_position(x, y, dx, dy)
+
+    # events arriving after frame n-1 is rendered are handled before frame n,
+    # handlers may look at the modifier state of the window (ctrl + click)
+    def _log(self, event, *args):
+        modifiers = self.wnd.modifiers
+        self._write({'frame': self.frame, 'event': event, 'args': list(args),
+                     'modifiers': [bool(modifiers.shift), bool(modifiers.ctrl), bool(modifiers.alt)]})
+
+    def _write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+# Drives a SceneBuilder from an input log with the recorded fixed time step.
+class InputReplayer(object):
+    def __init__(self, file_path: str):
+        self.events = defaultdict(list)
+        self.frames = 0
+        with open(file_path, 'r') as file:
+            header = json.loads(file.readline())
+            if header.get('version', 0) > record_version:
+                raise ValueError(f"Unsupported input log version {header['version']}: {file_path}")
+            for line in file:
+                record = json.loads(line)
+                if 'event' in record:
+                    self.events[record['frame']].append(
+                        (record['event'], record['args'], record['modifiers']))
+                    self.frames = max(self.frames, record['frame'] + 1)
+                elif 'frames' in record:
+                    self.frames = record['frames']
+        self.time_step = header['time_step']
+        self.seed = header['seed']
+        self.size = tuple(header['size'])
+        self.scene = header.get('scene', "cubes0")    #version 1 logs start from the default scene
+        self.world = header.get('world')
+
+    # load the scene the recording started from
+    def load_scene(self, builder: SceneBuilder):
+        if self.world:
+            builder.stream(self.world)
+        elif self.scene != builder.scene.scene_name:
+            builder.reload(self.scene)
+
+    def start(self):
+        numpy.random.seed(self.seed)
+
+    # dispatch the events of the frame, return (time, frame time) to render it with
+    def next_frame(self, frame: int, wnd: BaseWindow, builder: SceneBuilder):
+        for event, args, (shift, ctrl, alt) in self.events.get(frame, ()):
+            modifiers = wnd.modifiers
+            modifiers.shift, modifiers.ctrl, modifiers.alt = shift, ctrl, alt
+            if event == 'key_event':
+                key, action = args
+                builder.key_event(self._key(wnd, key), self._key(wnd, action), modifiers)
+            else:
+                getattr(builder, event)(*args)
+        return (frame * self.time_step, self.time_step)
+
+    def _key(self, wnd, name):
+        return getattr(wnd.keys, name) if isinstance(name, str) else name
+
+# trace written by a replay: frame, frame ms, eye x, eye y, eye z, cube count
+trace_header = "frame,frame_ms,eye_x,eye_y,eye_z,cubes"
+
+def write_trace(file_path: str, rows):
+    numpy.savetxt(file_path, numpy.asarray(rows), delimiter=',',
+                  fmt=['%d', '%.3f', '%.4f', '%.4f', '%.4f', '%d'],
+                  header=trace_header, comments='')
+
+# compare the traces of two replays: python input_recorder.py <trace a> <trace b>
+if __name__ == '__main__':
+    import sys
+
+    a, b = (numpy.loadtxt(file_path, delimiter=',', skiprows=1, ndmin=2) for file_path in sys.argv[1:3])
+    n = min(len(a), len(b))
+    drift = numpy.linalg.norm(a[:n, 2:5] - b[:n, 2:5], axis=1)
+    diverged = numpy.flatnonzero((drift > 1e-3) | (a[:n, 5] != b[:n, 5]))
+    print(f"frames: {len(a)} / {len(b)}")
+    print(f"frame ms median: {numpy.median(a[:, 1]):.2f} / {numpy.median(b[:, 1]):.2f}, "
+          f"p95: {numpy.percentile(a[:, 1], 95):.2f} / {numpy.percentile(b[:, 1], 95):.2f}")
+    if len(diverged):
+        print(f"diverged at frame {int(a[diverged[0], 0])}, max eye drift {drift.max():.4f}")
+    else:
+        print("eye path and cube count identical")
@@ -0,0 +1,53 @@
+import moderngl as gl
+
+min_capacity = 256
+
+# GPU buffer for per-instance attributes that grows geometrically.
+# Vertex arrays bound to it must be rebuilt whenever reserve()/fit() reallocate.
+class InstanceBuffer(object):
+    def __init__(self,
+                 ctx: gl.Context,
+                 stride: int,
+                 count: int = 0):
+        self.ctx = ctx
+        self.stride = stride
+        self.capacity = self._grow_size(count)
+        self.buffer = ctx.buffer(reserve = self.capacity*stride)
+
+    # make room for count instances, keeping the current content
+    # return True when the buffer was reallocated
+    def reserve(self, count):
+        if count <= self.capacity:
+            return False
+        capacity = self._grow_size(max(count, 2*self.capacity))
+        buffer = self.ctx.buffer(reserve = capacity*self.stride)
+        self.ctx.copy_buffer(buffer, self.buffer)
+        self._replace(buffer, capacity)
+        return True
+
+    # size the buffer for a freshly loaded scene, content is discarded
+    # return True when the buffer was reallocated
+    def fit(self, count):
+        capacity = self._grow_size(count)
+        if count <= self.capacity <= 4*capacity:
+            return False
+        self._replace(self.ctx.buffer(reserve = capacity*self.stride), capacity)
+        return True
+
+    def write(self, data, offset = 0):
+        self.buffer.write(data, offset)
+
+    def clear(self):
+        self.buffer.clear()
+
+    def _replace(self, buffer, capacity):
+        self.buffer.release()
+        self.buffer = buffer
+        self.capacity = capacity
+
+    @classmethod
+    def _grow_size(cls, count):
+        capacity = min_capacity
+        while capacity < count:
+            capacity *= 2
+        return capacity
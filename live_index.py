@@ -0,0 +1,108 @@
+import numpy
+from math import pi
+from motion_path import MotionPath, path_dtype
+from scene_generator import unit_size
+
+tau = 2.0 * pi
+# _overlapped covers 3 cells per axis, enough while the margin (1.1 times the
+# sample spacing) stays below half a cell
+max_spacing = 0.45 * unit_size
+
+# Grid cells swept by the live cubes, each with the phase intervals during
+# which a cube overlaps it. A cube's phase is theta = speed * time + phase
+# (mod 2*pi, see motion_path.py), so the intervals repeat every period of the
+# cube. Several cubes may share a cell; a query at time t only returns the
+# cubes inside the cell at t, so collision tests skip the rest of the path.
+# Intervals come from sampling the path: a sample marks the cells within
+# the spacing of the samples of the cube, and intervals are padded by one
+# sample, so a cube is never missed between two samples.
+class LiveIndex(object):
+    def __init__(self):
+        self.cells = dict()    #cell: [(cube index, speed, phase, ((lo, hi), ...)), ...]
+        self.swept = set()    #cells a cube passes through, without the sampling margin
+
+    def clear(self):
+        self.cells.clear()
+        self.swept.clear()
+
+    def add(self, index, path):
+        path = numpy.asarray(path, dtype=path_dtype).reshape(1)
+        speed = float(path['speed'][0])
+        phase = float(path['phase'][0])
+        if speed == 0.0:    #still cube, always at its phase
+            ca, cb = MotionPath.phase_coefficients(path['kind'], numpy.array([phase]))
+            centers = path['offset'] + path['axis_a'] * ca[:, None] + path['axis_b'] * cb[:, None]
+            for cell in map(tuple, self._overlapped(centers, 0.0)[0].tolist()):
+                self.cells.setdefault(cell, []).append((index, speed, phase, ((0.0, tau),)))
+                self.swept.add(cell)
+            return
+
+        theta, centers = MotionPath.samples(path)
+        step = theta[1] - theta[0]
+        spacing = numpy.linalg.norm(centers - numpy.roll(centers, 1, axis=0), axis=1).max()
+        assert spacing < max_spacing, f"live cube samples {spacing:.3f} apart"
+        self.swept.update(map(tuple, self._overlapped(centers, 0.0)[0].tolist()))
+        cells, sample = self._overlapped(centers, 1.1 * spacing)
+        # sort the (cell, sample) pairs by cell, then sample
+        local = cells - cells.min(axis=0)
+        dims = local.max(axis=0) + 1
+        key = (local[:, 0]*dims[1] + local[:, 1])*dims[2] + local[:, 2]
+        order = numpy.lexsort((sample, key))
+        cells, key, sample = cells[order], key[order], sample[order]
+        # runs of consecutive samples inside the same cell
+        new_cell = numpy.ones(len(key), dtype=bool)
+        new_cell[1:] = key[1:] != key[:-1]
+        run_start = new_cell.copy()
+        run_start[1:] |= sample[1:] > sample[:-1] + 1
+        starts = numpy.flatnonzero(run_start)
+        ends = numpy.append(starts[1:], len(sample)) - 1
+
+        intervals = dict()
+        run_cells = map(tuple, cells[starts].tolist())
+        lows = (theta[sample[starts]] - step).tolist()
+        highs = (theta[sample[ends]] + step).tolist()
+        for cell, lo, hi in zip(run_cells, lows, highs):
+            intervals.setdefault(cell, []).extend(self._wrap(lo, hi))
+        for cell, spans in intervals.items():
+            self.cells.setdefault(cell, []).append((index, speed, phase, tuple(spans)))
+
+    # indices of the cubes overlapping the cell at time
+    def active(self, cell, time: float):
+        for index, speed, phase, intervals in self.cells.get(cell, ()):
+            theta = (speed * time + phase) % tau
+            for lo, hi in intervals:
+                if lo <= theta <= hi:
+                    yield index
+                    break
+
+    # does any cube pass through the cell
+    def __contains__(self, cell):
+        return cell in self.swept
+
+    def __len__(self):
+        return len(self.cells)
+
+    # (cells, sample) pairs of the cells overlapped by a unit cube at each
+    # center grown by margin: |center - k| < 1 + margin on every axis
+    @classmethod
+    def _overlapped(cls, centers, margin):
+        reach = 1.0 + margin / unit_size
+        local = centers / unit_size
+        low = numpy.floor(local - reach).astype('i8') + 1
+        high = numpy.ceil(local + reach).astype('i8') - 1
+        offsets = numpy.array([(x, y, z) for x in range(3) for y in range(3) for z in range(3)])
+        cells = low[:, None, :] + offsets[None, :, :]
+        inside = (cells <= high[:, None, :]).all(axis=2)
+        sample = numpy.repeat(numpy.arange(len(centers)), len(offsets)).reshape(inside.shape)
+        return (cells[inside], sample[inside])
+
+    # (lo, hi) split into intervals within [0, 2*pi]
+    @classmethod
+    def _wrap(cls, lo, hi):
+        if hi - lo >= tau:
+            return [(0.0, tau)]
+        if lo < 0.0:
+            return [(lo + tau, tau), (0.0, hi)]
+        if hi > tau:
+            return [(lo, tau), (0.0, hi - tau)]
+        return [(lo, hi)]
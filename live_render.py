@@ -3,43 +3,75 @@ import moderngl as gl
 from pyrr import Matrix44
 from resource_manager import ResourceManger
 from scene_objects import SceneObjects
-from scene_generator import SceneGenerator, unit_size
+from scene_generator import SceneGenerator, unit_size, half_unit, base_center
 from scene_tracker import SceneTracker
+from instance_buffer import InstanceBuffer
+from motion_path import MotionPath, MotionKind, path_dtype
+from frustum import Frustum
 
-max_number = 200
+# per-instance layout of path_dtype
+instance_format = '3f 1f 3f 1f 3f 1f 3f /i'
+instance_attributes = ('in_offset', 'in_kind', 'in_axis_a', 'in_speed',
+                       'in_axis_b', 'in_phase', 'in_color')
 
 class LiveCubeRender(object):
     def __init__(self,
                  ctx: gl.Context,
                  tracker: SceneTracker):
+        self.ctx = ctx
         self.tracker = tracker
         self.prog = ResourceManger.get_shader('live_cube')
-        cube_pos = ctx.buffer(SceneGenerator.cube())
-        cube_normals = ctx.buffer(SceneGenerator.cube_normals())
+        self.cube_pos = ctx.buffer(SceneGenerator.cube())
+        self.cube_normals = ctx.buffer(SceneGenerator.cube_normals())
         
-        self.cubes.extend(SceneObjects.load_cubes("live"))
-        self.vbo = ctx.buffer(reserve = max_number*36)
-        self.vbo.write(numpy.array(self.cubes).astype('f4'))
+        SceneObjects.live_cubes = SceneObjects.load_live_cubes("live")
+        self.vbo = InstanceBuffer(ctx, path_dtype.itemsize, self.cube_number)
+        self.vbo.write(self.cubes)
         self.tracker.reload_live_cubes(self.cubes)
         
-        self.vao = ctx.vertex_array(
+        # frustum culled cubes are drawn from a compacted copy
+        self.visible_vbo = InstanceBuffer(ctx, path_dtype.itemsize, self.cube_number)
+        self.visible = None
+        self.drawn = 0
+        self.culled = 0
+        self.update_bounds()
+        self.bind_instances()
+    
+    # (re)create the vertex arrays on the current instance buffers
+    def bind_instances(self):
+        self.vao = self.ctx.vertex_array(
+            self.prog, [
+                (self.cube_pos, '3f /v', 'in_vert'),
+                (self.cube_normals, '3f /v', 'in_normal'),
+                (self.vbo.buffer, instance_format, *instance_attributes)
+            ])
+        self.vao_visible = self.ctx.vertex_array(
             self.prog, [
-                (cube_pos, '3f /v', 'in_vert'),
-                (cube_normals, '3f /v', 'in_normal'),
-                (self.vbo, '3f 3f 3f /i', 'in_offset', 'in_dir', 'in_color')
+                (self.cube_pos, '3f /v', 'in_vert'),
+                (self.cube_normals, '3f /v', 'in_normal'),
+                (self.visible_vbo.buffer, instance_format, *instance_attributes)
             ])
+    
+    # box swept by every cube over its whole motion path
+    def update_bounds(self):
+        low, high = MotionPath.bounds(self.cubes)
+        self.box_min = low + base_center - half_unit
+        self.box_max = high + base_center + half_unit
+        self.visible = None
        
     def init_cubes(self):
-        color =  (0.5, 0.5, 0.0)   
-        center = (0.0, 0.0, 4*unit_size)
-        dir = (0, 3, 0)
-        self.add_cube(center, dir, color)
-        center = (10.0, 0.0, 4*unit_size)
-        dir = (3, 0, 0)
-        self.add_cube(center, dir, color)
-        center = (0.0, 10.0, 2*unit_size)
-        dir = (0, 0, 3)
-        self.add_cube(center, dir, color)
+        self.add_cube(MotionPath.path(MotionKind.Linear, (0.0, 0.0, 4*unit_size), (0, 3, 0)))
+        self.add_cube(MotionPath.path(MotionKind.Linear, (10.0, 0.0, 4*unit_size), (3, 0, 0)))
+        self.add_cube(MotionPath.path(MotionKind.Linear, (0.0, 10.0, 2*unit_size), (0, 0, 3)))
+    
+    # n random paths of every kind, for benchmarks
+    def add_random_cubes(self, count, seed = 0):
+        SceneObjects.live_cubes = numpy.append(self.cubes, MotionPath.random(count, seed))
+        if self.vbo.reserve(self.cube_number):
+            self.bind_instances()
+        self.vbo.write(self.cubes)
+        self.tracker.reload_live_cubes(self.cubes)
+        self.update_bounds()
     
     def save(self, file_name = "live"):
         SceneObjects.save_live_cubes(self.cubes, file_name)
@@ -53,16 +85,36 @@ class LiveCubeRender(object):
     def update_time(self, time: float):
         self.prog['time'].value = time
     
-    def add_cube(self, pos, dir, color):          
-        new_cube = [pos[0], pos[1], pos[2], 
-                    dir[0], dir[1], dir[2],
-                    color[0], color[1], color[2]]
-        self.cubes.extend(new_cube)
-        self.vbo.write(numpy.array(new_cube).astype('f4'), 36*(self.cube_number-1))
-        self.tracker.add_live_cube(self.cube_number - 1)
+    # path: a path_dtype record, see MotionPath.path
+    def add_cube(self, path):
+        SceneObjects.live_cubes = numpy.append(self.cubes, path)
+        if self.vbo.reserve(self.cube_number):
+            self.bind_instances()
+        self.vbo.write(self.cubes[-1:], path_dtype.itemsize*(self.cube_number-1))
+        self.tracker.add_live_cube(path)
+        self.update_bounds()
+        
+    def render(self, frustum: Frustum = None):
+        if frustum is None or self.cube_number == 0:
+            self.vao.render(gl.TRIANGLES, instances=self.cube_number)
+            self.drawn, self.culled = self.cube_number, 0
+            return
+        
+        visible = frustum.boxes_visible(self.box_min, self.box_max)
+        self.drawn = int(visible.sum())
+        self.culled = self.cube_number - self.drawn
+        if self.culled == 0:
+            self.vao.render(gl.TRIANGLES, instances=self.cube_number)
+            return
         
-    def render(self):
-        self.vao.render(gl.TRIANGLES, instances=self.cube_number)
+        # repack only when the visible set changed
+        if self.visible is None or not numpy.array_equal(visible, self.visible):
+            cubes = self.cubes[visible]
+            if self.visible_vbo.reserve(self.drawn):
+                self.bind_instances()
+            self.visible_vbo.write(cubes)
+            self.visible = visible
+        self.vao_visible.render(gl.TRIANGLES, instances=self.drawn)
     
     @property
     def cubes(self):
@@ -70,4 +122,4 @@ class LiveCubeRender(object):
         
     @property
     def cube_number(self):
-        return int(len(self.cubes) / 9)
\ No newline at end of file
+        return len(self.cubes)
\ No newline at end of file
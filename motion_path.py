@@ -0,0 +1,166 @@
+import numpy
+from enum import Enum
+from math import pi, ceil
+from scene_generator import unit_size
+
+# Live cube paths, evaluated the same way by live_cube.vs and on the CPU:
+#   theta = speed * time + phase
+#   position = offset + ca(theta) * axis_a + cb(theta) * axis_b
+# with the coefficients (ca, cb) of the path kind
+#   Linear: (1 - sin(theta), 0), back and forth over [0, 2] * axis_a
+#   Circle: (cos(theta), sin(theta)), ellipse around offset
+#   Spline: closed Catmull-Rom loop through offset, +a, +a+b, +b
+# A path repeats every 2*pi/speed seconds.
+class MotionKind(Enum):
+    Linear = 0
+    Circle = 1
+    Spline = 2
+
+# one record per live cube, same layout as the live cube instance VBO
+# ('3f 1f 3f 1f 3f 1f 3f /i')
+path_dtype = numpy.dtype([
+    ('offset', 'f4', 3), ('kind', 'f4'),
+    ('axis_a', 'f4', 3), ('speed', 'f4'),
+    ('axis_b', 'f4', 3), ('phase', 'f4'),
+    ('color', 'f4', 3)])
+path_fields = 15
+legacy_fields = 9    #offset, dir, color of the old live cube files
+
+# spline control points as multiples of (axis_a, axis_b)
+spline_a = numpy.array([0.0, 1.0, 1.0, 0.0])
+spline_b = numpy.array([0.0, 0.0, 1.0, 1.0])
+# range of the spline coefficients, Catmull-Rom overshoots the control points
+spline_range = (-0.125, 1.125)
+
+class MotionPath(object):
+    @classmethod
+    def path(cls, kind: MotionKind, offset, axis_a, axis_b = (0, 0, 0),
+             color = (0.5, 0.5, 0.0), speed = 1.0, phase = 0.0):
+        record = numpy.zeros(1, dtype=path_dtype)
+        record['offset'] = offset
+        record['kind'] = kind.value
+        record['axis_a'] = axis_a
+        record['speed'] = speed
+        record['axis_b'] = axis_b
+        record['phase'] = phase
+        record['color'] = color
+        return record
+
+    # records of rows of path_fields values, or legacy_fields values (linear paths)
+    @classmethod
+    def from_rows(cls, rows):
+        paths = numpy.zeros(len(rows), dtype=path_dtype)
+        values = paths.view('f4').reshape(-1, path_fields)
+        for i, row in enumerate(rows):
+            if len(row) == legacy_fields:
+                paths['offset'][i] = row[0:3]
+                paths['axis_a'][i] = row[3:6]
+                paths['speed'][i] = 1.0
+                paths['color'][i] = row[6:9]
+            elif len(row) == path_fields:
+                values[i] = row
+            else:
+                raise ValueError(f"Motion path row of {len(row)} values")
+        return paths
+
+    @classmethod
+    def coefficients(cls, paths, time: float):
+        theta = paths['speed'].astype('f8') * time + paths['phase']
+        return cls.phase_coefficients(paths['kind'], theta)
+
+    @classmethod
+    def phase_coefficients(cls, kind, theta):
+        ca = 1.0 - numpy.sin(theta)
+        cb = numpy.zeros(len(theta))
+        circle = kind == MotionKind.Circle.value
+        ca[circle] = numpy.cos(theta[circle])
+        cb[circle] = numpy.sin(theta[circle])
+
+        spline = kind == MotionKind.Spline.value
+        if spline.any():
+            s = numpy.mod(theta[spline] * (2.0 / pi), 4.0)    #4 segments per period
+            segment = numpy.floor(s)
+            u = s - segment
+            u2, u3 = u*u, u*u*u
+            weights = 0.5 * numpy.stack((-u + 2*u2 - u3,
+                                         2 - 5*u2 + 3*u3,
+                                         u + 4*u2 - 3*u3,
+                                         -u2 + u3), axis=1)
+            points = (segment.astype('i8')[:, None] + numpy.arange(-1, 3)) % 4
+            ca[spline] = (weights * spline_a[points]).sum(axis=1)
+            cb[spline] = (weights * spline_b[points]).sum(axis=1)
+        return (ca, cb)
+
+    # (n, 3) positions of all paths at time, relative to the cube origin
+    @classmethod
+    def evaluate(cls, paths, time: float, out = None):
+        ca, cb = cls.coefficients(paths, time)
+        if out is None:
+            out = numpy.empty((len(paths), 3))
+        numpy.multiply(paths['axis_a'], ca[:, None], out=out)
+        out += paths['axis_b'] * cb[:, None]
+        out += paths['offset']
+        return out
+
+    # (min, max) of the positions over the whole period
+    @classmethod
+    def bounds(cls, paths):
+        kind = paths['kind']
+        a = paths['axis_a'].astype('f8')
+        b = paths['axis_b'].astype('f8')
+        lo_a = numpy.where(kind == MotionKind.Spline.value, spline_range[0], 0.0)[:, None]
+        hi_a = numpy.where(kind == MotionKind.Spline.value, spline_range[1], 2.0)[:, None]
+        lo_b = numpy.where(kind == MotionKind.Spline.value, spline_range[0], 0.0)[:, None]
+        hi_b = numpy.where(kind == MotionKind.Spline.value, spline_range[1], 0.0)[:, None]
+        low = numpy.minimum(lo_a*a, hi_a*a) + numpy.minimum(lo_b*b, hi_b*b)
+        high = numpy.maximum(lo_a*a, hi_a*a) + numpy.maximum(lo_b*b, hi_b*b)
+        circle = kind == MotionKind.Circle.value
+        radius = numpy.sqrt(a[circle]**2 + b[circle]**2)
+        low[circle] = -radius
+        high[circle] = radius
+        return (paths['offset'] + low, paths['offset'] + high)
+
+    # (theta, positions) of one path sampled over a period, theta uniform in
+    # [0, 2*pi), 16 samples per unit of extent: positions less than 2*pi/16
+    # (about 0.39) units apart, live_index.py relies on it
+    @classmethod
+    def samples(cls, path):
+        path = numpy.asarray(path, dtype=path_dtype).reshape(1)
+        extent = numpy.abs(path['axis_a']).sum() + numpy.abs(path['axis_b']).sum()
+        count = 16 * (ceil(extent / unit_size) + 1)
+        theta = numpy.arange(count) * (2.0 * pi / count)
+        ca, cb = cls.phase_coefficients(numpy.repeat(path['kind'], count), theta)
+        return (theta, path['offset'] + path['axis_a'] * ca[:, None] + path['axis_b'] * cb[:, None])
+
+    # n paths spread over the ground, all kinds mixed
+    @classmethod
+    def random(cls, count, seed = 0, extent = 14.0):
+        rng = numpy.random.default_rng(seed)
+        paths = numpy.zeros(count, dtype=path_dtype)
+        paths['offset'][:, :2] = rng.uniform(-extent, extent, (count, 2))
+        paths['offset'][:, 2] = rng.integers(1, 8, count)
+        paths['kind'] = rng.integers(0, 3, count)
+        paths['axis_a'] = rng.integers(-3, 4, (count, 3)) * (1, 1, 0)
+        paths['axis_b'] = rng.integers(-3, 4, (count, 3)) * (1, 0, 1)
+        paths['speed'] = rng.uniform(0.5, 2.0, count)
+        paths['phase'] = rng.uniform(0.0, 2.0 * pi, count)
+        paths['color'] = rng.uniform(0.2, 1.0, (count, 3))
+        return paths
+
+# CPU benchmark: python motion_path.py [max count]
+if __name__ == '__main__':
+    import sys
+    from time import perf_counter
+
+    max_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    count = 100
+    while count <= max_count:
+        paths = MotionPath.random(count)
+        out = numpy.empty((count, 3))
+        frames = 200
+        start = perf_counter()
+        for frame in range(frames):
+            MotionPath.evaluate(paths, frame / 60.0, out)
+        duration = perf_counter() - start
+        print("{0:>7} live cubes: {1:.3f} ms/frame".format(count, duration / frames * 1000.0))
+        count *= 10
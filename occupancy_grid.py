@@ -0,0 +1,222 @@
+import numpy
+
+# free cells kept around the occupied bounds when the grid grows
+grid_margin = 16
+# largest dense volume in cells (bytes), cells beyond it are kept in a set
+max_volume = 1 << 26
+
+# Set of occupied grid cells backed by a dense uint8 volume that grows to the
+# bounds of the cells added, doubling along the axis that overflows. Point
+# queries are a bounds check and one byte lookup, box and batch queries are
+# NumPy slices of the same memory. Cells that would grow the volume past
+# max_volume (far outliers) go to a sparse set instead, always outside the
+# volume, so a point query looks at one or the other.
+# Keeps the dict API the scene map had (key in grid, grid[key] = True,
+# del grid[key], pop, update) for the callers that still use tuples.
+class OccupancyGrid(object):
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._allocate((0, 0, 0), (0, 0, 0))
+        self.sparse = set()
+        self.count = 0
+
+    # point queries, cells outside the volume are free
+    def occupied(self, x, y, z):
+        x -= self.ox
+        y -= self.oy
+        z -= self.oz
+        if 0 <= x < self.sx and 0 <= y < self.sy and 0 <= z < self.sz:
+            return self.cells[(x*self.sy + y)*self.sz + z] != 0
+        return bool(self.sparse) and (x+self.ox, y+self.oy, z+self.oz) in self.sparse
+
+    def add(self, x, y, z):
+        if not self._reserve((x, y, z), (x, y, z)):
+            if (x, y, z) not in self.sparse:
+                self.sparse.add((x, y, z))
+                self.count += 1
+            return
+        index = ((x-self.ox)*self.sy + (y-self.oy))*self.sz + (z-self.oz)
+        if not self.cells[index]:
+            self.cells[index] = 1
+            self.count += 1
+
+    def remove(self, x, y, z):
+        if self.sparse and (x, y, z) in self.sparse:
+            self.sparse.discard((x, y, z))
+            self.count -= 1
+            return True
+        if self.occupied(x, y, z):
+            self.cells[((x-self.ox)*self.sy + (y-self.oy))*self.sz + (z-self.oz)] = 0
+            self.count -= 1
+            return True
+        return False
+
+    # batch queries, cells: (n, 3) ints
+    def contains_cells(self, cells):
+        local = numpy.asarray(cells, dtype='i8').reshape(-1, 3) - self.origin
+        inside = ((local >= 0) & (local < self.shape)).all(axis=1)
+        result = numpy.zeros(len(local), dtype=bool)
+        inside_cells = local[inside]
+        result[inside] = self.volume[inside_cells[:, 0], inside_cells[:, 1], inside_cells[:, 2]] != 0
+        if self.sparse:
+            outside = numpy.flatnonzero(~inside)
+            cells = map(tuple, (local[outside] + self.origin).tolist())
+            result[outside] = [cell in self.sparse for cell in cells]
+        return result
+
+    def add_cells(self, cells):
+        cells = numpy.asarray(cells, dtype='i8').reshape(-1, 3)
+        if len(cells) == 0:
+            return
+        if not self._reserve(tuple(cells.min(axis=0).tolist()), tuple(cells.max(axis=0).tolist())):
+            # too far apart for one volume: what fits now goes in at once,
+            # the rest one by one
+            local = cells - self.origin
+            inside = ((local >= 0) & (local < self.shape)).all(axis=1)
+            for x, y, z in cells[~inside].tolist():
+                self.add(x, y, z)
+            cells = cells[inside]
+        local = cells - self.origin
+        self.volume[local[:, 0], local[:, 1], local[:, 2]] = 1
+        self._recount()
+
+    def remove_cells(self, cells):
+        cells = numpy.asarray(cells, dtype='i8').reshape(-1, 3)
+        local = cells - self.origin
+        inside = ((local >= 0) & (local < self.shape)).all(axis=1)
+        sparse_count = len(self.sparse)
+        if self.sparse:
+            self.sparse.difference_update(map(tuple, cells[~inside].tolist()))
+        local = local[inside]
+        if len(local) == 0 and len(self.sparse) == sparse_count:
+            return
+        self.volume[local[:, 0], local[:, 1], local[:, 2]] = 0
+        self._recount()
+        if self.count == 0:
+            self.clear()
+        elif self.volume.size > 64 * max(self.count, 4096):
+            self._trim()
+
+    # is any cell of the box between the corner cells (inclusive) occupied
+    def box_occupied(self, min_cell, max_cell):
+        lo = numpy.maximum(numpy.asarray(min_cell) - self.origin, 0)
+        hi = numpy.minimum(numpy.asarray(max_cell) - self.origin + 1, self.shape)
+        if (hi > lo).all() and self.volume[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]].any():
+            return True
+        return any(all(min_cell[i] <= cell[i] <= max_cell[i] for i in range(3))
+                   for cell in self.sparse)
+
+    # occupied cells as an (n, 3) array
+    def to_cells(self):
+        cells = numpy.argwhere(self.volume) + self.origin
+        if self.sparse:
+            cells = numpy.concatenate((cells, numpy.array(list(self.sparse), dtype='i8')))
+        return cells
+
+    # dict API
+    def __contains__(self, key):
+        return self.occupied(key[0], key[1], key[2])
+
+    def __setitem__(self, key, value):
+        self.add(key[0], key[1], key[2])
+
+    def __getitem__(self, key):
+        if not self.occupied(key[0], key[1], key[2]):
+            raise KeyError(key)
+        return True
+
+    def __delitem__(self, key):
+        if not self.remove(key[0], key[1], key[2]):
+            raise KeyError(key)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default = None):
+        return True if self.occupied(key[0], key[1], key[2]) else default
+
+    def pop(self, key, default = None):
+        return True if self.remove(key[0], key[1], key[2]) else default
+
+    def keys(self):
+        return list(map(tuple, self.to_cells().tolist()))
+
+    def update(self, other):
+        self.add_cells(numpy.array(list(other), dtype='i8').reshape(-1, 3))
+
+    # grow the volume to cover the cells between lo and hi (inclusive), return
+    # False when that would take more than max_volume cells
+    def _reserve(self, lo, hi):
+        if (self.ox <= lo[0] and self.oy <= lo[1] and self.oz <= lo[2] and
+                hi[0] < self.ox+self.sx and hi[1] < self.oy+self.sy and hi[2] < self.oz+self.sz):
+            return True
+        if self.count == 0:
+            new_lo = [lo[i] - grid_margin for i in range(3)]
+            new_hi = [hi[i] + grid_margin for i in range(3)]
+            return self._fits(new_lo, new_hi) and self._resize(new_lo, new_hi)
+        
+        old_lo = list(self.origin)
+        old_hi = [self.origin[i] + self.shape[i] - 1 for i in range(3)]
+        # at least double the extent along an axis that overflows, so
+        # building in one direction copies the volume a logarithmic number
+        # of times, fall back to the exact bounds near max_volume
+        new_lo = [min(old_lo[i], lo[i] - grid_margin) for i in range(3)]
+        new_hi = [max(old_hi[i], hi[i] + grid_margin) for i in range(3)]
+        grown_lo = [min(new_lo[i], old_lo[i] - self.shape[i]) if lo[i] < old_lo[i] else new_lo[i]
+                    for i in range(3)]
+        grown_hi = [max(new_hi[i], old_hi[i] + self.shape[i]) if hi[i] > old_hi[i] else new_hi[i]
+                    for i in range(3)]
+        if self._fits(grown_lo, grown_hi):
+            return self._resize(grown_lo, grown_hi)
+        return self._fits(new_lo, new_hi) and self._resize(new_lo, new_hi)
+
+    # shrink the volume to the occupied bounds plus a margin
+    def _trim(self):
+        cells = self.to_cells()
+        self.clear()
+        self.add_cells(cells)
+
+    def _recount(self):
+        self.count = int(numpy.count_nonzero(self.volume)) + len(self.sparse)
+
+    @classmethod
+    def _fits(cls, lo, hi):
+        return (hi[0]-lo[0]+1) * (hi[1]-lo[1]+1) * (hi[2]-lo[2]+1) <= max_volume
+
+    def _resize(self, lo, hi):
+        old_volume, old_origin = self.volume, self.origin
+        self._allocate(tuple(int(v) for v in lo), tuple(int(hi[i]) - int(lo[i]) + 1 for i in range(3)))
+        # overlap of the old and new volume
+        lo = numpy.maximum(old_origin, self.origin)
+        hi = numpy.minimum(numpy.add(old_origin, old_volume.shape), numpy.add(self.origin, self.shape))
+        if old_volume.size > 0 and (hi > lo).all():
+            src = tuple(slice(lo[i] - old_origin[i], hi[i] - old_origin[i]) for i in range(3))
+            dst = tuple(slice(lo[i] - self.origin[i], hi[i] - self.origin[i]) for i in range(3))
+            self.volume[dst] = old_volume[src]
+        self._take_sparse()
+        return True
+
+    # move the sparse cells the volume now covers into it
+    def _take_sparse(self):
+        if not self.sparse:
+            return
+        cells = numpy.array(list(self.sparse), dtype='i8')
+        local = cells - self.origin
+        inside = ((local >= 0) & (local < self.shape)).all(axis=1)
+        if inside.any():
+            local = local[inside]
+            self.volume[local[:, 0], local[:, 1], local[:, 2]] = 1
+            self.sparse.difference_update(map(tuple, cells[inside].tolist()))
+
+    def _allocate(self, origin, shape):
+        self.origin = origin
+        self.shape = shape
+        self.ox, self.oy, self.oz = origin
+        self.sx, self.sy, self.sz = shape
+        self.cells = bytearray(shape[0] * shape[1] * shape[2])
+        self.volume = numpy.frombuffer(self.cells, dtype='u1').reshape(shape)
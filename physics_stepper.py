@@ -0,0 +1,43 @@
+# Fixed time step simulation decoupled from the render frame rate.
+# Frame time is accumulated and consumed in whole steps of 1/rate seconds,
+# at most max_steps per frame: after a long stall the rest of the backlog is
+# dropped instead of spiralling into ever longer frames. Rendering
+# interpolates between the last two steps with the leftover fraction.
+class PhysicsStepper(object):
+    def __init__(self,
+                 rate = 120.0,
+                 max_steps = 8):
+        self.step_time = 1.0 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.time = None    #simulation time of the last step
+        self.steps = 0    #steps run in the last frame
+        self.dropped = 0.0    #seconds of backlog dropped so far
+
+    # run the steps covering frame_time, step(t, dt) advances the simulation
+    # return the interpolation factor between the last two steps
+    def advance(self, time, frame_time, step):
+        if self.time is None:
+            self.time = time
+        self.accumulator += frame_time
+        self.steps = 0
+        while self.accumulator >= self.step_time:
+            if self.steps == self.max_steps:
+                backlog = self.accumulator - self.accumulator % self.step_time
+                self.dropped += backlog
+                self.accumulator -= backlog
+                break
+            self.time += self.step_time
+            step(self.time, self.step_time)
+            self.accumulator -= self.step_time
+            self.steps += 1
+        return self.alpha
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.step_time
+
+    # time matching the interpolated view, for animations drawn with it
+    @property
+    def render_time(self):
+        return self.time - self.step_time + self.accumulator
@@ -0,0 +1,54 @@
+import numpy
+import moderngl as gl
+from enum import Enum
+from collections import deque
+
+# frames between issuing a pick readback and consuming it
+pick_latency = 2
+
+class PickEngine(Enum):
+    GPU = 0    #pick buffer readback
+    CPU = 1    #ray cast through the occupancy grid
+
+class PickAction(Enum):
+    ADD = 0
+    REMOVE = 1
+    SELECT = 2
+
+class PickRequest(object):
+    def __init__(self, action: PickAction, eye, frame: int, pbo: gl.Buffer):
+        self.action = action
+        self.eye = eye
+        self.frame = frame
+        self.pbo = pbo
+
+# Clicks read the pick buffer into pixel buffer objects, so the CPU does not
+# wait for the GPU. The pick data (cube offset, face id) is consumed a few
+# frames later, in the order the clicks happened.
+class PickQueue(object):
+    def __init__(self,
+                 ctx: gl.Context,
+                 fbo: gl.Framebuffer):
+        self.ctx = ctx
+        self.fbo = fbo
+        self.pending = deque()
+        self.free_pbos = []
+
+    def request(self, action: PickAction, x, y, eye, frame: int):
+        pbo = self.free_pbos.pop() if self.free_pbos else self.ctx.buffer(reserve = 16)
+        self.fbo.read_into(pbo, viewport=(int(x), int(y), 1, 1),
+                           components=4, attachment=0, dtype='f4')
+        self.pending.append(PickRequest(action, eye, frame, pbo))
+
+    # yield (request, pick data) of every request old enough to read without stalling
+    def resolve(self, frame: int, flush = False):
+        while self.pending and (flush or frame - self.pending[0].frame >= pick_latency):
+            request = self.pending.popleft()
+            data = numpy.frombuffer(request.pbo.read(), dtype='f4')
+            self.free_pbos.append(request.pbo)
+            yield (request, data)
+
+    def clear(self):
+        for request in self.pending:
+            self.free_pbos.append(request.pbo)
+        self.pending.clear()
@@ -0,0 +1,106 @@
+import numpy
+from math import floor, inf
+from scene_generator import SceneGenerator, unit_size, base_center
+from occupancy_grid import OccupancyGrid
+
+pick_distance = 256 * unit_size
+
+# face id of the face hit when the ray steps into a cell, see cube_face_map
+face_ids = {(0, 0, 1): 0, (1, 0, 0): 1, (0, -1, 0): 2,
+            (-1, 0, 0): 3, (0, 0, -1): 4, (0, 1, 0): 5}
+
+no_pick = numpy.array([-1.0, -1.0, -1.0, -1.0], dtype='f4')
+
+# CPU picking: cast the camera ray through the occupancy grid with the
+# Amanatides-Woo traversal. The result has the same layout as the GPU pick
+# buffer: (offset x, offset y, offset z, face id); ground hits report the cell
+# under the ground plane and face 0, like the ground pick texture.
+class RayPicker(object):
+    def __init__(self, scene_map: OccupancyGrid):
+        self.scene_map = scene_map
+
+    def pick(self, origin, direction, max_distance = pick_distance):
+        # grid space: cell (i, j, k) spans [i-0.5, i+0.5) x [j-0.5, j+0.5) x [k-0.5, k+0.5)
+        pos = [(origin[i] - base_center[i]) / unit_size for i in range(3)]
+        dir = [float(direction[i]) for i in range(3)]
+        length = (dir[0]**2 + dir[1]**2 + dir[2]**2) ** 0.5
+        if length == 0:
+            return no_pick
+        dir = [d / length for d in dir]
+
+        cell = [floor(p + 0.5) for p in pos]
+        step = [0, 0, 0]
+        t_max = [inf, inf, inf]
+        t_delta = [inf, inf, inf]
+        for i in range(3):
+            if dir[i] > 0:
+                step[i] = 1
+                t_max[i] = (cell[i] + 0.5 - pos[i]) / dir[i]
+                t_delta[i] = 1.0 / dir[i]
+            elif dir[i] < 0:
+                step[i] = -1
+                t_max[i] = (cell[i] - 0.5 - pos[i]) / dir[i]
+                t_delta[i] = -1.0 / dir[i]
+
+        limit = max_distance / unit_size
+        t = 0.0
+        while t <= limit:
+            axis = t_max.index(min(t_max))
+            t = t_max[axis]
+            cell[axis] += step[axis]
+            t_max[axis] += t_delta[axis]
+
+            if self.scene_map.occupied(cell[0], cell[1], cell[2]):
+                normal = [0, 0, 0]
+                normal[axis] = -step[axis]
+                return self._pick_data(cell, face_ids[tuple(normal)])
+            if cell[2] == -1 and SceneGenerator.is_in_grid((cell[0]*unit_size, cell[1]*unit_size)):
+                return self._pick_data(cell, 0)
+            if cell[2] < -1 and step[2] <= 0:
+                break
+        return no_pick
+
+    # ray through window pixel (x, y), y going up, for the given projection and view
+    @classmethod
+    def screen_ray(cls, x, y, size, proj, view):
+        ndc_x = 2.0 * x / size[0] - 1.0
+        ndc_y = 2.0 * y / size[1] - 1.0
+        # pyrr matrices transform row vectors: clip = pos * view * proj
+        inverse = numpy.linalg.inv(numpy.asarray(view) @ numpy.asarray(proj))
+        near = numpy.array([ndc_x, ndc_y, -1.0, 1.0]) @ inverse
+        far = numpy.array([ndc_x, ndc_y, 1.0, 1.0]) @ inverse
+        near = near[:3] / near[3]
+        far = far[:3] / far[3]
+        return (near, far - near)
+
+    @classmethod
+    def _pick_data(cls, cell, face_id):
+        return numpy.array([cell[0]*unit_size, cell[1]*unit_size, cell[2]*unit_size, face_id],
+                           dtype='f4')
+
+# headless benchmark: python ray_picker.py [scene] [rays]
+if __name__ == '__main__':
+    import sys
+    from time import perf_counter
+    from resource_manager import ResourceManger
+    from scene_objects import SceneObjects
+    from cube_store import CubeStore
+
+    ResourceManger.initialize()
+    name = sys.argv[1] if len(sys.argv) > 1 else "cubes_HTY"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    store = CubeStore()
+    store.load(SceneObjects.load_cubes(name))
+    grid = OccupancyGrid()
+    grid.add_cells(store.cells())
+    picker = RayPicker(grid)
+
+    rng = numpy.random.default_rng(0)
+    origins = rng.uniform(-20, 20, (count, 3)) + (0, 0, 25)
+    targets = rng.uniform(-15, 15, (count, 3)) * (1, 1, 0.5) + (0, 0, 5)
+    start = perf_counter()
+    hits = sum(picker.pick(o, t - o)[3] >= 0 for o, t in zip(origins, targets))
+    duration = perf_counter() - start
+    print("{0}: {1} cubes, {2} rays, {3} hits, {4:.2f} us/ray".format(
+        name, len(store), count, hits, duration / count * 1e6))
@@ -0,0 +1,242 @@
+import os
+import queue
+import threading
+import numpy
+from collections import OrderedDict
+from logger import logger
+from scene_generator import base_center
+from cube_store import CubeStore, cube_dtype, chunk_size, offsets_to_cells, offset_to_cell, cell_to_chunk
+from scene_tracker import SceneTracker
+from scene_file import SceneFile
+
+# Region file: the cubes of a scene sorted by region (one region = one chunk)
+#   magic, version, header size, region count, dtype descriptor length,
+#   dtype descriptor, region index (key, cube count, first record),
+#   zero padding, records starting at the header size
+# Same header layout and alignment as the binary scene files (SceneFile).
+region_magic = b'CUBEREG\0'
+region_version = 1
+region_index_dtype = numpy.dtype([('key', '<i4', 3), ('count', '<u4'), ('start', '<u8')])
+
+class RegionFile(object):
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            _, header_size, region_count, descr_size = SceneFile.read_header(
+                file, file_path, region_magic, region_version, "region file")
+            self.dtype = SceneFile.decode_dtype(file.read(descr_size))
+            index = numpy.frombuffer(file.read(region_count*region_index_dtype.itemsize),
+                                     dtype=region_index_dtype)
+        self.index = {tuple(key): (int(start), int(count))
+                      for key, count, start in zip(index['key'].tolist(), index['count'], index['start'])}
+        total = int((index['start'] + index['count']).max()) if region_count else 0
+        self.records = numpy.memmap(file_path, dtype=self.dtype, mode='r',
+                                    offset=header_size, shape=(total,)) if total else None
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def read(self, key):
+        start, count = self.index[key]
+        return numpy.array(self.records[start:start+count])
+
+    @classmethod
+    def write(cls, file_path: str, records: numpy.ndarray):
+        records = numpy.ascontiguousarray(records)
+        keys = offsets_to_cells(records['pos']) // chunk_size
+        order = numpy.lexsort((keys[:, 2], keys[:, 1], keys[:, 0]))
+        records, keys = records[order], keys[order]
+        region_keys, starts, counts = numpy.unique(keys, axis=0, return_index=True, return_counts=True)
+        regions = {tuple(key): (int(start), int(count))
+                   for key, start, count in zip(region_keys.tolist(), starts, counts)}
+        cls.write_regions(file_path, records.dtype, {key: count for key, (_, count) in regions.items()},
+                          lambda key: records[regions[key][0]:regions[key][0]+regions[key][1]])
+
+    # write the regions one at a time, counts: {key: cube count}, read(key) returns
+    # the records of a region, so only one region is in memory at once
+    @classmethod
+    def write_regions(cls, file_path: str, dtype: numpy.dtype, counts: dict, read):
+        keys = sorted(key for key, count in counts.items() if count > 0)
+        index = numpy.zeros(len(keys), dtype=region_index_dtype)
+        index['key'] = numpy.array(keys, dtype='<i4').reshape(-1, 3)
+        index['count'] = [counts[key] for key in keys]
+        index['start'] = numpy.cumsum(index['count']) - index['count']
+        descr = SceneFile.encode_dtype(dtype)
+        with open(file_path, 'wb') as file:
+            SceneFile.write_header(file, region_magic, region_version, len(index), len(descr),
+                                   (descr, index.tobytes()))
+            for key in keys:
+                records = numpy.ascontiguousarray(read(key), dtype=dtype)
+                if len(records) != counts[key]:
+                    raise ValueError(f"Region {key} has {len(records)} cubes, {counts[key]} expected")
+                file.write(records.tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+
+# Keeps only the regions around the camera resident in the cube store.
+# Regions within prefetch_radius are read on a background thread, the ones
+# right around the eye are loaded synchronously if the prefetch fell behind,
+# so the tracker never sees a missing region next to the player. Least
+# recently used regions are evicted, except the edited ones.
+class RegionPager(object):
+    def __init__(self,
+                 file_path: str,
+                 store: CubeStore,
+                 tracker: SceneTracker,
+                 prefetch_radius = 2,
+                 max_resident = 256):
+        self.region_file = RegionFile(file_path)
+        self.store = store
+        self.tracker = tracker
+        self.prefetch_radius = prefetch_radius
+        self.max_resident = max_resident
+        self.resident = OrderedDict()
+        self.edited = set()    #regions changed since the last save
+        self.remapped = dict()    #{previous id: new id} of the cubes moved by evictions, see take_remapped
+        self.center = None
+
+        self.requests = queue.Queue()
+        self.loaded = queue.Queue()
+        self.queued = set()
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self._prefetch, daemon=True)
+        self.worker.start()
+
+    # call once per frame before moving the camera
+    # return True when cubes were paged in or out
+    def update(self, eye):
+        changed = self._apply_loaded()
+        eye_cell = offset_to_cell((eye[0]-base_center[0], eye[1]-base_center[1], eye[2]-base_center[2]))
+        center = cell_to_chunk(eye_cell)
+
+        # regions touching the eye's region must be there before any clash test,
+        # edited regions are merged with their stored cubes
+        required = list(self._around(center, 1))
+        required.extend(key for key in self.edited if key in self.region_file)
+        for key in required:
+            if key not in self.resident:
+                self._insert(key, self.region_file.read(key))
+                changed = True
+        for key in self.edited:
+            self.resident.setdefault(key, True)
+
+        if center != self.center:
+            self.center = center
+            for key in self._around(center, self.prefetch_radius):
+                if key not in self.resident and key not in self.queued:
+                    self.queued.add(key)
+                    self.requests.put(key)
+        for key in self._around(center, self.prefetch_radius):
+            if key in self.resident:
+                self.resident.move_to_end(key)
+        return self._evict() or changed
+
+    # ids moved (or removed, None) by the evictions since the last call
+    def take_remapped(self):
+        remapped, self.remapped = self.remapped, dict()
+        return remapped
+
+    # edited regions stay resident until saved
+    def mark_edited(self, pos):
+        self.edited.add(cell_to_chunk(offset_to_cell(pos)))
+
+    # CubeRender edit listener
+    def cube_added(self, pos, color):
+        self.mark_edited(pos)
+
+    def cube_removed(self, pos):
+        self.mark_edited(pos)
+
+    def cube_moved(self, old_pos, new_pos):
+        self.mark_edited(old_pos)
+        self.mark_edited(new_pos)
+
+    def cube_recolored(self, pos, color):
+        self.mark_edited(pos)
+
+    # write resident regions back, merged with the ones still on disk. Regions
+    # are streamed one at a time into a temporary file that replaces the region
+    # file under the lock, the old file stays valid for readers until then.
+    def save(self, file_path: str = None):
+        file_path = file_path or self.region_file.file_path
+        region_file = self.region_file
+        counts = {key: count for key, (_, count) in region_file.index.items()
+                  if key not in self.resident}
+        counts.update((key, len(self.store.chunk_cubes(key))) for key in self.resident)
+
+        def read(key):
+            if key in self.resident:
+                return self.store.chunk_cubes(key)
+            return SceneFile.as_records(region_file.read(key), cube_dtype)
+
+        temp_path = file_path + '.tmp'
+        RegionFile.write_regions(temp_path, cube_dtype, counts, read)
+        with self.lock:
+            os.replace(temp_path, file_path)
+            self.region_file = RegionFile(file_path)
+        self.edited.clear()
+
+    def _around(self, center, radius):
+        for dx in range(-radius, radius+1):
+            for dy in range(-radius, radius+1):
+                for dz in range(-radius, radius+1):
+                    key = (center[0]+dx, center[1]+dy, center[2]+dz)
+                    if key in self.region_file:
+                        yield key
+
+    def _prefetch(self):
+        while True:
+            key = self.requests.get()
+            with self.lock:
+                records = self.region_file.read(key) if key in self.region_file else None
+            self.loaded.put((key, records))
+
+    def _apply_loaded(self):
+        changed = False
+        while True:
+            try:
+                key, records = self.loaded.get_nowait()
+            except queue.Empty:
+                return changed
+            self.queued.discard(key)
+            if records is not None and key not in self.resident:
+                self._insert(key, records)
+                changed = True
+
+    def _insert(self, key, records):
+        self.resident[key] = True
+        if len(records) == 0:
+            return
+        records = SceneFile.as_records(records, cube_dtype)
+        self.store.insert(records)
+        self.tracker.add_cells(offsets_to_cells(records['pos']))
+
+    def _evict(self):
+        evicted = False
+        near = set(self._around(self.center, self.prefetch_radius)) if self.center else set()
+        for key in list(self.resident):
+            if len(self.resident) <= self.max_resident:
+                break
+            if key in near or key in self.edited:
+                continue
+            self.tracker.remove_cells(offsets_to_cells(self.store.chunk_cubes(key)['pos']))
+            self.remapped = CubeStore.compose_remap(self.remapped, self.store.remove_chunk(key))
+            del self.resident[key]
+            evicted = True
+        if evicted:
+            logger.info(f"Regions resident: {len(self.resident)}")
+        return evicted
+
+# build a region file from a scene: python region_pager.py <scene> <region file>
+if __name__ == '__main__':
+    import sys
+    from scene_file import binary_ext
+
+    source, target = sys.argv[1], sys.argv[2]
+    if source.endswith(binary_ext):
+        records = SceneFile.read(source)
+    else:
+        with open(source, 'r') as file:
+            records = SceneFile.read_text(file.read(), cube_dtype)
+    RegionFile.write(target, records)
+    print(f"{source} -> {target}: {len(records)} cubes in {len(RegionFile(target).index)} regions")
@@ -1,66 +1,108 @@
-import freetype
-import pyglet
+import time
 from moderngl_window import resources
 from moderngl_window.meta import (
     TextureDescription, 
     ProgramDescription,
     DataDescription)
 from os import path
+from logger import logger
 
 Resource_dir = path.normpath(path.join(__file__, '../resources'))
 
+# name: (vertex shader, fragment shader)
+program_sources = {
+    'cross': ("shaders/cross.vs", "shaders/cross.fs"),    #crosshair
+    'ground': ("shaders/ground.vs", "shaders/ground.fs"),
+    'ground_pick': ("shaders/ground_pick.vs", "shaders/ground_pick.fs"),
+    'scene': ("shaders/scene.vs", "shaders/scene.fs"),
+    'chunk': ("shaders/chunk.vs", "shaders/scene.fs"),    #chunk meshes
+    'bbox': ("shaders/bbox.vs", "shaders/bbox.fs"),    #chunk boxes of the occlusion queries
+    'scene_pick': ("shaders/scene_pick.vs", "shaders/scene_pick.fs"),
+    'text': ("shaders/text.vs", "shaders/text.fs"),    #overlay text
+    'live_cube': ("shaders/live_cube.vs", "shaders/live_cube.fs")
+    }
+
+# name: file in resources/audio
+audio_files = {
+    'solid': "solid.wav",
+    'reset': "reset.wav"
+    }
+
+# Sound decoded on its first play, pyglet is only imported then
+class LazyAudio(object):
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.source = None
+    
+    def play(self):
+        if self.source is None:
+            start = time.perf_counter()
+            import pyglet
+            audio_path = [path.join(ResourceManger.resource_dir, "audio")]
+            if pyglet.resource.path != audio_path:
+                pyglet.resource.path = audio_path
+                pyglet.resource.reindex()
+            self.source = pyglet.resource.media(self.file_name, False)
+            ResourceManger.load_times[self.file_name] = (time.perf_counter() - start) * 1000.0
+        return self.source.play()
+
+# Program compiled on its first use, for programs not needed by the first
+# frame (picking, occlusion boxes, other mesh modes). Uniforms written
+# before then are kept and set once it is compiled.
+class LazyProgram(object):
+    def __init__(self, name: str):
+        self.name = name
+        self.prog = None
+        self.values = {}    #uniform: data written before compiling
+    
+    def write(self, uniform: str, data):
+        if self.prog is None:
+            self.values[uniform] = data
+        else:
+            self.prog[uniform].write(data)
+    
+    def get(self):
+        if self.prog is None:
+            self.prog = ResourceManger.get_shader(self.name)
+            for uniform, data in self.values.items():
+                self.prog[uniform].write(data)
+            self.values.clear()
+        return self.prog
+
 class ResourceManger(object):
     resource_dir = None
     _shaders = {}
     _textures = {}
     _audio = {}
+    load_times = {}    #ms spent compiling / decoding each resource
 
     @classmethod
     def initialize(cls, resource_dir = Resource_dir):
         cls.resource_dir = resource_dir
         resources.register_dir(resource_dir)
-        pyglet.resource.path = [path.join(resource_dir, "audio")]
 
+    # programs are compiled on the first get_shader, see compile_all
     @classmethod
     def load_all_resources(cls):
-        # crosshair shader
-        cls._shaders['cross'] = ResourceManger._load_program(
-            vertex_shader="shaders/cross.vs",
-            fragment_shader="shaders/cross.fs"
-        )
-        
-        # ground shader
-        cls._shaders['ground'] = ResourceManger._load_program(
-            vertex_shader="shaders/ground.vs",
-            fragment_shader="shaders/ground.fs")
-        
-        # ground picking shader
-        cls._shaders['ground_pick'] = ResourceManger._load_program(
-            vertex_shader="shaders/ground_pick.vs",
-            fragment_shader="shaders/ground_pick.fs")
-
-        # scene shader
-        cls._shaders['scene']  = ResourceManger._load_program(
-            vertex_shader="shaders/scene.vs",
-            fragment_shader="shaders/scene.fs")
+        cls._shaders.clear()
+        cls._audio = {name: LazyAudio(file_name) for name, file_name in audio_files.items()}
         
-        # scene_picking shader
-        cls._shaders['scene_pick'] = ResourceManger._load_program(
-            vertex_shader="shaders/scene_pick.vs",
-            fragment_shader="shaders/scene_pick.fs")
-        
-        # live cube shader
-        cls._shaders['live_cube'] = ResourceManger._load_program(
-            vertex_shader="shaders/live_cube.vs",
-            fragment_shader="shaders/live_cube.fs")
-        
-        # sounds
-        cls._audio['solid'] = pyglet.resource.media("solid.wav", False)
-        cls._audio['reset'] = pyglet.resource.media("reset.wav", False)
+    # compile every program now instead of on first use
+    @classmethod
+    def compile_all(cls):
+        for name in program_sources:
+            cls.get_shader(name)
         
     @classmethod
     def get_shader(cls, name):
-        return cls._shaders[name]
+        prog = cls._shaders.get(name)
+        if prog is None:
+            vertex_shader, fragment_shader = program_sources[name]
+            start = time.perf_counter()
+            prog = cls._load_program(vertex_shader, fragment_shader)
+            cls.load_times[name] = (time.perf_counter() - start) * 1000.0
+            cls._shaders[name] = prog
+        return prog
     
     @classmethod
     def get_texture(cls, name):
@@ -70,12 +112,31 @@ class ResourceManger(object):
     def get_audio(cls, name):
         return cls._audio[name]
     
+    @classmethod
+    def get_data_file(cls, file_name):
+        return path.join(cls.resource_dir, f"data/{file_name}")
+    
     @classmethod
     def get_screenshot(cls, name):
         return path.join(cls.resource_dir, f"screenshots/{name}.png")
     
+    # log the resources loaded so far with their load times
+    @classmethod
+    def log_load_times(cls):
+        for name, ms in cls.load_times.items():
+            logger.info(f"Loaded {name} in {ms:.2f}ms")
+        logger.info("Resources: {0:.2f}ms for {1} of {2} programs and {3} of {4} sounds".format(
+            sum(cls.load_times.values()),
+            len(cls._shaders), len(program_sources),
+            sum(audio.source is not None for audio in cls._audio.values()), len(audio_files)))
+    
+    @classmethod
+    def get_profile(cls, name):
+        return path.join(cls.resource_dir, f"profiles/{name}.csv")
+    
     @classmethod
     def _load_font(cls, fontname, height):
+        import freetype
         font_path = path.join(cls.resource_dir, "fonts", fontname)
         face = freetype.Face(font_path)
         face.set_pixel_sizes(0, height)
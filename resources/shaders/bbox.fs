@@ -0,0 +1,7 @@
+#version 330 core
+
+out vec4 f_color;
+
+void main(){
+    f_color = vec4(1.0);
+}
\ No newline at end of file
@@ -0,0 +1,12 @@
+#version 330 core
+
+in vec3 in_vert;
+
+uniform mat4 proj;
+uniform mat4 mv;
+uniform vec3 box_min;
+uniform vec3 box_size;
+
+void main(){
+    gl_Position = proj * mv * vec4(box_min + in_vert * box_size, 1.0);
+}
\ No newline at end of file
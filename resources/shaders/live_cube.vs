@@ -3,8 +3,13 @@
 in vec3 in_vert;
 in vec3 in_normal;
 
+// motion path, see motion_path.py
 in vec3 in_offset;
-in vec3 in_dir;
+in float in_kind;
+in vec3 in_axis_a;
+in float in_speed;
+in vec3 in_axis_b;
+in float in_phase;
 in vec3 in_color;
 
 uniform mat4 proj;
@@ -15,9 +20,39 @@ out vec3 normal;
 out vec3 pos;
 out vec3 color;
 
+const float PI = 3.14159265358979;
+const vec4 spline_a = vec4(0.0, 1.0, 1.0, 0.0);
+const vec4 spline_b = vec4(0.0, 0.0, 1.0, 1.0);
+
+// (ca, cb) of position = offset + ca * axis_a + cb * axis_b
+vec2 path_coefficients(int kind, float theta){
+    if (kind == 1){    // circle
+        return vec2(cos(theta), sin(theta));
+    }
+    if (kind == 2){    // closed Catmull-Rom spline, 4 segments per period
+        float s = mod(theta * (2.0 / PI), 4.0);
+        float segment = floor(s);
+        float u = s - segment;
+        float u2 = u * u;
+        float u3 = u2 * u;
+        vec4 weights = 0.5 * vec4(-u + 2.0*u2 - u3,
+                                  2.0 - 5.0*u2 + 3.0*u3,
+                                  u + 4.0*u2 - 3.0*u3,
+                                  -u2 + u3);
+        int first = int(segment) + 3;
+        vec2 c = vec2(0.0);
+        for (int i = 0; i < 4; i++){
+            int point = (first + i) % 4;
+            c += weights[i] * vec2(spline_a[point], spline_b[point]);
+        }
+        return c;
+    }
+    return vec2(1.0 - sin(theta), 0.0);    // linear
+}
+
 void main(){
-    // vec3 move = 5.0 * vec3(sin(time), cos(time), 0.0);
-    vec3 move = (1.0 - sin(time)) * in_dir;
+    vec2 c = path_coefficients(int(in_kind + 0.5), in_speed * time + in_phase);
+    vec3 move = c.x * in_axis_a + c.y * in_axis_b;
     vec4 pos_view =  mv * vec4(in_vert + in_offset + move, 1.0);
     gl_Position = proj * pos_view;
 
@@ -0,0 +1,13 @@
+#version 330 core
+
+uniform sampler2D font;
+
+in vec2 v_uv;
+
+out vec4 f_color;
+
+void main(){
+    if (texture(font, v_uv).r < 0.5)
+        discard;
+    f_color = vec4(1.0, 1.0, 0.6, 1.0);
+}
\ No newline at end of file
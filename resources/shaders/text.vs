@@ -0,0 +1,14 @@
+#version 330 core
+
+uniform vec2 screen_size;
+
+in vec2 in_vert;
+in vec2 in_uv;
+
+out vec2 v_uv;
+
+void main(){
+    vec2 pos = in_vert / screen_size * 2.0 - 1.0;
+    gl_Position = vec4(pos.x, -pos.y, 0.0, 1.0);
+    v_uv = in_uv;
+}
\ No newline at end of file
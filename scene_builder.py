@@ -1,5 +1,6 @@
+import os
 import uuid
-from PIL import Image
+import numpy
 from moderngl_window import BaseWindow
 from scene_generator import colors, KeyActions
 from resource_manager import ResourceManger
@@ -8,26 +9,51 @@ from scene_tracker import SceneTracker
 from cross_render import CrossRender
 from ground_render import GroundRender
 from cube_render import CubeRender
+from scene_objects import SceneObjects
+from scene_file import text_ext
 from live_render import LiveCubeRender
+from pick_queue import PickQueue, PickAction, PickEngine
+from ray_picker import RayPicker
+from region_pager import RegionPager
+from frustum import Frustum
+from screen_capture import ScreenCapture
+from frame_profiler import FrameProfiler
+from text_render import TextRender
+from physics_stepper import PhysicsStepper
 from pyrr import Matrix44
+from logger import logger
     
 class SceneBuilder(object):
-    def __init__(self, wnd: BaseWindow):
+    def __init__(self, wnd: BaseWindow, journaled = True):
         self.wnd = wnd
         self.ctx = self.wnd.ctx
         self.fbo = self.initializeFramebuffer()
+        self.picks = PickQueue(self.ctx, self.fbo)
+        self.screenshots = ScreenCapture(self.ctx, self.wnd.fbo)
+        self.profiler = FrameProfiler(self.ctx, ('update', 'physics', 'uniforms', 'pick',
+                                                 'ground', 'scene', 'live'))
+        self.physics = PhysicsStepper()
+        self.overlay = None    #profiler text, shown when set
+        self.pick_engine = PickEngine.GPU
+        self.frame = 0
+        self.view = None
+        self.pick_view = None
+        self.pick_version = None
         
         self.tracker = SceneTracker()  
         self.cross = CrossRender(self.ctx, self.wnd.aspect_ratio) 
         self.ground = GroundRender(self.ctx)
-        self.scene = CubeRender(self.ctx, self.tracker)
+        self.scene = CubeRender(self.ctx, self.tracker, journaled)
         self.live_cubes = LiveCubeRender(self.ctx, self.tracker)
+        self.ray_picker = RayPicker(self.tracker.scene_map)
+        self.pager = None    #set when streaming a region file
         
         # set projection
         proj = Matrix44.perspective_projection(60.0, self.wnd.aspect_ratio, 0.01, 1000)
         self.ground.set_projection(proj)
-        self.scene.set_projection(proj)
+        self.scene.set_projection(proj, self.wnd.height)
         self.live_cubes.set_projection(proj)
+        self.proj = proj
         
         # init cameras
         self.orbit_camera = OrbitCamera(self.tracker)
@@ -60,8 +86,42 @@ class SceneBuilder(object):
     
     # reload scene from data file
     def reload(self, filename = "cubes0"):
+        self.picks.clear()
         self.scene.reload(filename)
         self.camera.reset()
+    
+    # stream a large scene from a region file, only the regions around the camera stay loaded
+    def stream(self, file_path: str):
+        self.picks.clear()
+        self.scene.reload(None)
+        if self.pager is not None:
+            self.scene.listeners.remove(self.pager)
+        self.pager = RegionPager(file_path, self.scene.cubes, self.tracker)
+        self.scene.listeners.append(self.pager)
+        self.pager.update(self.camera.position)
+        self.scene.sync_instances()
+        self.camera.reset()
+    
+    def save(self):
+        if not self.scene.journaled:    #recording or replaying input, scene files stay as recorded
+            return
+        if self.pager is not None:
+            self.pager.save()
+        else:
+            self.scene.save()
+    
+    # current scene in the text format, next to its binary snapshot
+    def export_text(self):
+        name = self.scene.scene_name
+        if name is None:
+            logger.info("Streamed scenes have no text format")
+            return
+        SceneObjects.save_cubes(self.scene.cubes, name)
+        logger.info(f"Exported {self.scene.cube_number} cubes to {name}{text_ext}")
+    
+    def close(self):
+        self.scene.journal.close()
+        self.screenshots.flush()
 
     def switch_camera(self):
         if self.camera.mode == CameraMode.Orbit:
@@ -73,6 +133,13 @@ class SceneBuilder(object):
             self.wnd.mouse_exclusivity = False
             self.camera.reset()
     
+    def switch_pick_engine(self):
+        if self.pick_engine == PickEngine.GPU:
+            self.pick_engine = PickEngine.CPU
+        else:
+            self.pick_engine = PickEngine.GPU
+        logger.info(f"Pick engine: {self.pick_engine.name}")
+    
     def key_event(self, key, action, modifiers):
         keys = self.wnd.keys
         key_pressed = (action == keys.ACTION_PRESS)
@@ -83,10 +150,24 @@ class SceneBuilder(object):
                 self.scene.cube_color = colors[key-keys.NUMBER_0]
             elif key == keys.I:
                 self.switch_camera()
+            elif key == keys.O and modifiers.shift:
+                self.export_text()
             elif key == keys.O:
-                self.scene.save()
+                self.save()
             elif key == keys.P:
-                self.capture_screen()
+                self.screenshots.request()
+            elif key == keys.K:
+                self.switch_pick_engine()
+            elif key == keys.M:
+                self.scene.switch_mesh_mode()
+            elif key == keys.H:
+                self.scene.switch_occlusion()
+            elif key == keys.L:
+                self.scene.switch_lod()
+            elif key == keys.T:
+                self.switch_overlay()
+            elif key == keys.E:
+                self.export_profile()
             
     def mouse_press(self, x: int, y: int, button: int):
         self.building = True
@@ -100,14 +181,32 @@ class SceneBuilder(object):
         else:
             target_x, target_y = self.wnd.width/2, self.wnd.height/2
         
-        self.fbo.use()
         if button == 1:
-            if self.wnd.modifiers.ctrl:
-                self.scene.select_cube(target_x, target_y)
-            else:
-                self.scene.add_cube(target_x, target_y, self.camera.position) 
+            action = PickAction.SELECT if self.wnd.modifiers.ctrl else PickAction.ADD
         elif button == 2:
-            self.scene.remove_cube(target_x, target_y, self.camera.position)
+            action = PickAction.REMOVE
+        else:
+            return
+        
+        eye = self.camera.position.copy()
+        if self.pick_engine == PickEngine.CPU:
+            # apply queued GPU picks first to keep clicks in order
+            for request, pick in self.picks.resolve(self.frame, flush=True):
+                self.apply_pick(request.action, pick, request.eye)
+            origin, dir = RayPicker.screen_ray(target_x, target_y, self.wnd.size, self.proj, self.view)
+            self.apply_pick(action, self.ray_picker.pick(origin, dir), eye)
+        else:
+            self.render_picker()
+            self.picks.request(action, target_x, target_y, eye, self.frame)
+    
+    def apply_pick(self, action: PickAction, pick, eye):
+        match action:
+            case PickAction.ADD:
+                self.scene.add_cube(pick, eye)
+            case PickAction.REMOVE:
+                self.scene.remove_cube(pick, eye)
+            case PickAction.SELECT:
+                self.scene.select_cube(pick)
                
     def mouse_drag(self, x: int, y: int, dx: int, dy: int):
         self.building = False
@@ -125,33 +224,81 @@ class SceneBuilder(object):
             self.camera.rot_state(dx, dy)
         
     def render(self, time, frame_time):
-        lookat = self.camera.look_and_move(time, frame_time)
-        self.ground.update_view(lookat)
-        self.scene.update_view(lookat)
-        self.live_cubes.update_view(lookat)
-        self.live_cubes.update_time(time)
+        self.frame += 1
+        profiler = self.profiler
+        with profiler.stage('update'):
+            for request, pick in self.picks.resolve(self.frame):
+                self.apply_pick(request.action, pick, request.eye)
+            if self.pager is not None and self.pager.update(self.camera.position):
+                self.scene.sync_instances(self.pager.take_remapped())
+            self.scene.journal.update()
         
+        with profiler.stage('physics'):
+            alpha = self.physics.advance(time, frame_time, self.camera.step)
+            lookat = self.camera.view(alpha)
+        with profiler.stage('uniforms'):
+            self.ground.update_view(lookat)
+            self.scene.update_view(lookat)
+            self.live_cubes.update_view(lookat)
+            self.live_cubes.update_time(self.physics.render_time)
+        self.view = lookat
+        frustum = Frustum(self.proj, lookat)
         
-        self.fbo.use()
-        self.fbo.clear(-1, -1, -1, -1)
-        self.ground.render_picker()
-        self.scene.render_picker()
-        
-        self.ctx.screen.use()
+        self.wnd.use()
         if self.camera.mode == CameraMode.Walk:
             self.cross.render()
-        self.ground.render()
-        self.scene.render()
-        self.live_cubes.render()
-    
-    def capture_screen(self):
-        file_name = uuid.uuid4()
-        screen = Image.frombytes('RGB', 
-                                self.ctx.screen.size, 
-                                self.ctx.screen.read(), 
-                                'raw', 'RGB', 0, -1)
-        screen.save(ResourceManger.get_screenshot(file_name))
+        with profiler.stage('ground'):
+            self.ground.render()
+        with profiler.stage('scene'):
+            self.scene.render(frustum, self.camera.position)
+        with profiler.stage('live'):
+            self.live_cubes.render(frustum)
+        if self.overlay is not None:
+            if self.frame % 30 == 0:
+                self.overlay.set_text(profiler.report())
+            self.overlay.render()
+        self.screenshots.update(self.frame)
+        profiler.end_frame()
+    
+    def switch_overlay(self):
+        if self.overlay is None:
+            self.overlay = TextRender(self.ctx, self.wnd.size)
+            self.overlay.set_text(self.profiler.report())
+        else:
+            self.overlay = None
     
+    # per-frame stage timings of the profiler window into resources/profiles
+    def export_profile(self, file_path: str = None):
+        if file_path is None:
+            file_path = ResourceManger.get_profile(uuid.uuid4())
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self.profiler.export_csv(file_path)
+        logger.info(f"Profile: {file_path}")
+    
+    # drawn and culled counts of the last frame
+    @property
+    def culling_stats(self):
+        return {
+            'chunks_drawn': self.scene.chunks.drawn,
+            'chunks_culled': self.scene.chunks.culled,
+            'chunks_occluded': self.scene.chunks.occluded,
+            'live_drawn': self.live_cubes.drawn,
+            'live_culled': self.live_cubes.culled
+            }
+    
+    # refresh the pick buffer only if the view or the scene changed since the last pass
+    def render_picker(self):
+        self.fbo.use()
+        if (self.pick_version == self.scene.version and 
+            numpy.array_equal(self.pick_view, self.view)):
+            return
+        
+        with self.profiler.stage('pick'):
+            self.fbo.clear(-1, -1, -1, -1)
+            self.ground.render_picker()
+            self.scene.render_picker()
+        self.pick_view = self.view
+        self.pick_version = self.scene.version
     
     # def log_info(self):
     #     self.tracker.log_info()
@@ -0,0 +1,137 @@
+import json
+import struct
+import numpy
+from os import path
+
+# Binary scene file:
+#   magic, version, header size, record count, dtype descriptor length,
+#   journal generation (version 2), dtype descriptor (JSON of numpy
+#   dtype.descr), zero padding, records as one contiguous array starting at
+#   the header size
+# The generation is the first edit journal not folded into the records,
+# version 1 files are generation 0.
+magic = b'CUBESCN\0'
+version = 2
+header_format = '<8sIIQI'
+generation_format = '<Q'
+header_align = 16
+binary_ext = '.cubes'
+text_ext = '.scene'
+
+class SceneFile(object):
+    @classmethod
+    def write(cls, file_path: str, records: numpy.ndarray, generation = 0):
+        records = numpy.ascontiguousarray(records)
+        descr = cls.encode_dtype(records.dtype)
+        with open(file_path, 'wb') as file:
+            cls.write_header(file, magic, version, len(records), len(descr),
+                             (struct.pack(generation_format, generation), descr))
+            file.write(records.tobytes())
+
+    # records of the file, memory-mapped unless mmap is False
+    @classmethod
+    def read(cls, file_path: str, mmap = True):
+        with open(file_path, 'rb') as file:
+            file_version, header_size, count, descr_size = cls.read_header(
+                file, file_path, magic, version, "binary scene file")
+            if file_version >= 2:
+                file.read(struct.calcsize(generation_format))
+            dtype = cls.decode_dtype(file.read(descr_size))
+            if count == 0:
+                return numpy.zeros(0, dtype=dtype)
+            if not mmap:
+                file.seek(header_size)
+                return numpy.frombuffer(file.read(count*dtype.itemsize), dtype=dtype)
+        return numpy.memmap(file_path, dtype=dtype, mode='r', offset=header_size, shape=(count,))
+
+    # journal generation of the snapshot
+    @classmethod
+    def generation(cls, file_path: str):
+        with open(file_path, 'rb') as file:
+            file_version, _, _, _ = cls.read_header(file, file_path, magic, version, "binary scene file")
+            if file_version < 2:
+                return 0
+            return struct.unpack(generation_format, file.read(struct.calcsize(generation_format)))[0]
+
+    # header_format header followed by the sections, zero padded to header_align,
+    # also used by the region files; return the header size
+    @classmethod
+    def write_header(cls, file, file_magic: bytes, file_version: int, count: int,
+                     descr_size: int, sections):
+        size = struct.calcsize(header_format) + sum(len(section) for section in sections)
+        header_size = (size + header_align - 1) // header_align * header_align
+        file.write(struct.pack(header_format, file_magic, file_version, header_size, count, descr_size))
+        for section in sections:
+            file.write(section)
+        file.write(bytes(header_size - size))
+        return header_size
+
+    # (version, header size, count, dtype descriptor length) of a header_format header
+    @classmethod
+    def read_header(cls, file, file_path: str, file_magic: bytes, max_version: int, kind: str):
+        header = file.read(struct.calcsize(header_format))
+        if len(header) < struct.calcsize(header_format):
+            raise ValueError(f"Not a {kind}: {file_path}")
+        found_magic, file_version, header_size, count, descr_size = struct.unpack(header_format, header)
+        if found_magic != file_magic:
+            raise ValueError(f"Not a {kind}: {file_path}")
+        if file_version > max_version:
+            raise ValueError(f"Unsupported {kind} version {file_version}: {file_path}")
+        return (file_version, header_size, count, descr_size)
+
+    @classmethod
+    def encode_dtype(cls, dtype: numpy.dtype):
+        return json.dumps(dtype.descr).encode('utf-8')
+
+    @classmethod
+    def decode_dtype(cls, data: bytes):
+        return numpy.dtype([tuple(field[:2]) + ((tuple(field[2]),) if len(field) > 2 else ())
+                            for field in json.loads(data.decode('utf-8'))])
+
+    # records of another layout are converted field by field
+    @classmethod
+    def as_records(cls, records: numpy.ndarray, dtype: numpy.dtype):
+        if records.dtype == dtype:
+            return records
+        converted = numpy.zeros(len(records), dtype=dtype)
+        for field in dtype.names:
+            converted[field] = records[field]
+        return converted
+
+    # text scene, one record of whitespace separated floats per line
+    @classmethod
+    def read_text(cls, data: str, dtype: numpy.dtype):
+        values = numpy.array(data.split(), dtype='f4')
+        return values.reshape(-1, dtype.itemsize // 4).view(dtype).reshape(-1)
+
+    # inverse of read_text, records of 4-byte float fields only
+    @classmethod
+    def write_text(cls, file_path: str, records: numpy.ndarray, fmt = "%.2f"):
+        records = numpy.ascontiguousarray(records)
+        values = records.view('f4').reshape(-1, records.dtype.itemsize // 4)
+        with open(file_path, 'w') as file:
+            numpy.savetxt(file, values, fmt=fmt)
+
+    @classmethod
+    def convert(cls, text_path: str, binary_path: str, dtype: numpy.dtype):
+        with open(text_path, 'r') as file:
+            records = cls.read_text(file.read(), dtype)
+        cls.write(binary_path, records)
+        return len(records)
+
+# convert text scenes to the binary format: python scene_file.py [name ...]
+if __name__ == '__main__':
+    import sys
+    from glob import glob
+    from cube_store import cube_dtype
+
+    data_dir = path.normpath(path.join(__file__, '../resources/data'))
+    names = sys.argv[1:] or [path.splitext(path.basename(file))[0]
+                             for file in glob(path.join(data_dir, '*' + text_ext))]
+    for name in names:
+        if name == 'live':    #live cubes stay in the text format
+            continue
+        text_path = path.join(data_dir, name + text_ext)
+        binary_path = path.join(data_dir, name + binary_ext)
+        count = SceneFile.convert(text_path, binary_path, cube_dtype)
+        print(f"{text_path} -> {binary_path}: {count} cubes")
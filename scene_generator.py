@@ -55,6 +55,12 @@ class SceneGenerator(object):
             return True
         return False  
     
+    # is_in_grid of (n, 2) points
+    @classmethod
+    def are_in_grid(cls, points):
+        points = numpy.abs(numpy.asarray(points)[..., :2])
+        return (points <= ground_width).all(axis=-1)
+    
     @classmethod
     def gridOffsetTexture(cls, 
                           size = int(ground_width*2), 
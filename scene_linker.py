@@ -1,50 +1,61 @@
-from math import sin
+import numpy
 from pyrr import Vector3
-from scene_generator import base_center, unit_size
-from scene_objects import Grid3D, SceneObjects
+from scene_generator import base_center
+from motion_path import MotionPath, path_dtype
 
-class LiveCube(object):
-    def __init__(self, index):
-        center = SceneObjects.live_cubes[9*index : 9*index+3]
-        dir = SceneObjects.live_cubes[9*index+3 : 9*index+6]
-        self.cube = Vector3(center) + Vector3(base_center)
-        self.dir = Vector3(dir)
-        self.dir_norm = self.dir.normalized
-        
-    def get_position(self, time: float):
-        return self.cube + (1.0 - sin(time)) * self.dir
-    
-    def get_range(self):
-        end = self.cube + 2 * self.dir
-        end = Grid3D.point_3d_to_index(end)
-        start = Grid3D.point_3d_to_index(self.cube)
-        while (start != end):
-            yield start
-            start = (start[0] + self.dir_norm[0], 
-                     start[1] + self.dir_norm[1],
-                     start[2] + self.dir_norm[2])
-        yield end
+# Motion paths of the live cubes (offset, axes, colour, ... see motion_path.py)
+# kept as one structured array. Positions of all cubes at time t are evaluated
+# in one call and cached, so the collision queries of a physics step only
+# index the cached rows.
+class LiveCubeTable(object):
+    def __init__(self):
+        self.load(numpy.zeros(0, dtype=path_dtype))
+
+    def load(self, paths):
+        self.paths = numpy.array(paths, dtype=path_dtype)
+        self.positions = numpy.empty((len(self.paths), 3))
+        self.time = None
+
+    def append(self, path):
+        self.load(numpy.append(self.paths, numpy.asarray(path, dtype=path_dtype)))
+        return self.count - 1
+
+    # positions of every cube at time t, evaluated once per distinct time
+    def update(self, time: float):
+        if time != self.time:
+            MotionPath.evaluate(self.paths, time, self.positions)
+            self.positions += base_center
+            self.time = time
+        return self.positions
+
+    # position of one cube as a view of the cached row
+    def get_position(self, index, time: float):
+        return self.update(time)[index].view(Vector3)
+
+    @property
+    def count(self):
+        return len(self.paths)
  
-# Link eye with cube
-# live cube position = pos + 3.0*(1.0 - sin(time))
+# Link eye with cube, the eye rides along the cube's motion path
 class Linkage(object):
-    def __init__(self):
+    def __init__(self, table: LiveCubeTable):
+        self.table = table
         self.linked = False
     
     def start_link(self, 
-                   live_cube: LiveCube,
+                   index,
                    eye_pos: Vector3,
                    time: float):
         self.linked = True
-        self.cube = live_cube
-        self.offset = eye_pos - self.cube.get_position(time)
+        self.index = index
+        self.offset = eye_pos - self.table.get_position(index, time)
          
     def update_offset(self, offset):
         self.offset.x += offset.x
         self.offset.y += offset.y
     
     def get_linked_eye(self, time):
-        cube_pos = self.cube.get_position(time)
+        cube_pos = self.table.get_position(self.index, time)
         return cube_pos + self.offset
         
     def end_link(self):
@@ -1,13 +1,20 @@
+import numpy
 from os import path
 from pyrr import Vector3
 from logger import logger
 from scene_generator import half_unit, unit_size, body_height, body_clash, base_center
 from resource_manager import ResourceManger
+from cube_store import CubeStore, cube_dtype
+from scene_file import SceneFile, binary_ext, text_ext
+from motion_path import MotionPath, path_dtype, path_fields, legacy_fields
 
 cube_faces = ((1, 0, 0), (-1, 0, 0), 
               (0, 1, 0), (0, -1, 0), 
               (0, 0, 1), (0, 0, -1))
 
+# corner order of Grid3D.get_box_2d: (left, top), (right, top), (right, bottom), (left, bottom)
+box_corners = ((-1, 1), (1, 1), (1, -1), (-1, -1))
+
 class Box3D(object):
     def __init__(self, min: Vector3, max: Vector3):
         self.min = min
@@ -152,38 +159,117 @@ class Grid3D(object):
             index = int((offset+half_unit)/unit_size) if offset>=0 else int((offset-half_unit)/unit_size)
             all_index.append(index)
         return all_index
+    
+    # batched conversions, one NumPy pass for any number of points
+    @classmethod
+    def offsets_to_indices(cls, offsets):
+        offsets = numpy.asarray(offsets, dtype='f8')
+        shifted = numpy.where(offsets >= 0, offsets + half_unit, offsets - half_unit)
+        return numpy.trunc(shifted / unit_size).astype('i8')
+    
+    @classmethod
+    def points_2d_to_indices(cls, points):
+        points = numpy.asarray(points, dtype='f8')
+        return cls.offsets_to_indices(points[..., :2] - numpy.array(base_center[:2]))
+    
+    # (n, 4, 2) xy indices of the get_box_2d corners of n eyes
+    @classmethod
+    def get_box_2d_indices(cls, eyes):
+        eyes = numpy.asarray(eyes, dtype='f8').reshape(-1, 3)
+        corners = eyes[:, None, :2] + numpy.array(box_corners) * body_clash
+        return cls.points_2d_to_indices(corners)
+    
+    # get_grids of n eyes: (n, k, 3) cells in the same order and a (n, k) mask of
+    # the cells get_grids would yield (free fall drops the foot level when it
+    # coincides with the leg level)
+    @classmethod
+    def get_grids_batch(cls, eyes, dir = 0):
+        eyes = numpy.asarray(eyes, dtype='f8').reshape(-1, 3)
+        n = len(eyes)
+        eye_z = eyes[:, 2]
+        z_grid = cls.offsets_to_indices(numpy.stack((
+            eye_z + body_clash - base_center[2],
+            eye_z - unit_size - base_center[2],
+            eye_z - body_height - base_center[2]), axis=1))
+        valid = numpy.ones(z_grid.shape, dtype=bool)
+        if dir is None:   #move
+            z_grid, valid = z_grid[:, :2], valid[:, :2]
+        elif dir == 1:   #fly up
+            z_grid, valid = z_grid[:, :1], valid[:, :1]
+        elif dir == -1:   #fly down
+            z_grid, valid = z_grid[:, 2:], valid[:, 2:]
+        else:   #free
+            valid[:, 2] = z_grid[:, 1] != z_grid[:, 2]
+        z_grid, valid = z_grid[:, ::-1], valid[:, ::-1]
+        
+        levels = z_grid.shape[1]
+        cells = numpy.empty((n, levels, 4, 3), dtype='i8')
+        cells[:, :, :, :2] = cls.get_box_2d_indices(eyes)[:, None, :, :]
+        cells[:, :, :, 2] = z_grid[:, :, None]
+        valid = numpy.repeat(valid, 4, axis=1)
+        return (cells.reshape(n, levels*4, 3), valid)
 
 class SceneObjects(object):
-    cubes = []
-    live_cubes = []
+    cubes = CubeStore()
+    live_cubes = numpy.zeros(0, dtype=path_dtype)
     
+    # binary scene files take precedence over text ones of the same name
     @classmethod
     def load_cubes(cls, name: str):
+        binary_path = ResourceManger.get_data_file(name + binary_ext)
+        if path.exists(binary_path):
+            try:
+                cubes = SceneFile.read(binary_path)
+            except Exception as e:
+                logger.error(f"Error reading file: {name}{binary_ext} ({e})")
+            else:
+                return SceneFile.as_records(cubes, cube_dtype)
+        
+        try:
+            data = ResourceManger.load_data(f"data/{name}{text_ext}")
+        except:
+            logger.error(f"Error reading file: {name}{text_ext}")
+            return numpy.zeros(0, dtype=cube_dtype)
+        else:
+            return SceneFile.read_text(data, cube_dtype)
+    
+    # one motion path per line, lines of the old offset, dir, color format are linear paths
+    @classmethod
+    def load_live_cubes(cls, name: str):
         try:
             data = ResourceManger.load_data(f"data/{name}.scene")
         except:
             logger.error(f"Error reading file: {name}.scene")
-            return []
+            return numpy.zeros(0, dtype=path_dtype)
         else:
-            cubes = list(map(float, data.split()))
-            return cubes
+            return cls.read_live_cubes(data, name)
+
+    # malformed lines are logged and skipped, the rest of the file still loads
+    @classmethod
+    def read_live_cubes(cls, data: str, name: str):
+        rows = []
+        for number, line in enumerate(data.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                row = list(map(float, line.split()))
+            except ValueError:
+                row = None
+            if row is None or len(row) not in (legacy_fields, path_fields):
+                logger.warning(f"Skipped malformed line {number} of {name}.scene")
+                continue
+            rows.append(row)
+        return MotionPath.from_rows(rows)
     
+    # text scene of the cubes, edits journaled on top of the binary snapshot
+    # included; the text file is only loaded once the .cubes file is removed
     @classmethod
-    def save_cubes(cls, cubes: list, name: str):
-        length = len(cubes)
-        file_path = path.join(ResourceManger.resource_dir, f"data/{name}.scene")
-        with open(file_path, "w") as file:
-            for i in range(0, length, 6):
-                file.write("{:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f}\n".format(
-                    cubes[i], cubes[i+1], cubes[i+2], cubes[i+3], cubes[i+4], cubes[i+5]))
+    def save_cubes(cls, cubes: CubeStore, name: str):
+        SceneFile.write_text(ResourceManger.get_data_file(name + text_ext), cubes.instances)
     
     @classmethod
-    def save_live_cubes(cls, live_cubes: list, name: str):
-        length = len(live_cubes)
+    def save_live_cubes(cls, live_cubes: numpy.ndarray, name: str):
         file_path = path.join(ResourceManger.resource_dir, f"data/{name}.scene")
+        values = numpy.ascontiguousarray(live_cubes).view('f4').reshape(-1, path_fields)
         with open(file_path, "w") as file:
-            for i in range(0, length, 9):
-                file.write("{:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f}\n".format(
-                    live_cubes[i], live_cubes[i+1], live_cubes[i+2], 
-                    live_cubes[i+3], live_cubes[i+4], live_cubes[i+5],
-                    live_cubes[i+6], live_cubes[i+7], live_cubes[i+8]))
\ No newline at end of file
+            numpy.savetxt(file, values, fmt="%.6g")
\ No newline at end of file
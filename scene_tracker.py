@@ -1,10 +1,14 @@
+import numpy
 from enum import Enum
 from pyrr import Vector3
 from logger import logger 
 from scene_generator import *
 from resource_manager import ResourceManger
 from scene_objects import AABB, Grid3D
-from scene_linker import LiveCube
+from scene_linker import LiveCubeTable
+from live_index import LiveIndex
+from cube_store import CubeStore
+from occupancy_grid import OccupancyGrid
 
 ZERO = 1e-6
 
@@ -16,10 +20,11 @@ class ClashType(Enum):
     LiveXY = 4
     
 class ClashDetector(object):
-    def __init__(self, scene_map, live_map):
+    def __init__(self, scene_map, live_index: LiveIndex, live_table: LiveCubeTable):
         self.scene_map = scene_map
-        self.live_map = live_map
-        self.live_cube = None  #potential clashed live cube
+        self.live_index = live_index
+        self.live_table = live_table
+        self.live_cube = None  #index of the potential clashed live cube
         self.clash_points = 0x00
         self.move_direction = 0x00
         self.land_sound = ResourceManger.get_audio('solid')
@@ -39,8 +44,8 @@ class ClashDetector(object):
             self.land_sound.play()
             return True
         
-        for grid in Grid3D.get_grids(to_pos, dir):
-            if grid in self.scene_map:
+        for x, y, z in Grid3D.get_grids(to_pos, dir):
+            if self.scene_map.occupied(x, y, z):
                 return True
         return False
     
@@ -54,7 +59,7 @@ class ClashDetector(object):
         corners = Grid3D.get_box_2d(eye_pos)
         for corner in corners:
             x, y = Grid3D.point_2d_to_index(corner)
-            if (x, y, z_index) in self.scene_map:
+            if self.scene_map.occupied(x, y, z_index):
                 return False
         return True
     
@@ -68,41 +73,77 @@ class ClashDetector(object):
                 return True
         return False
     
+    # only the cubes inside a cell at time get the AABB test
     def detect_clash_with_live_cube(self, eye: Vector3, time: float):
         for grid in Grid3D.get_grids(eye):
-            if grid in self.live_map:
-                index = self.live_map[grid]
-                self.live_cube = LiveCube(index)
-                pos = self.live_cube.get_position(time) 
-                return AABB.get_penetration(eye, pos)
+            for index in self.live_index.active(grid, time):
+                penetration = AABB.get_penetration(eye, self.live_table.get_position(index, time))
+                if penetration is not None:
+                    self.live_cube = index
+                    return penetration
         return None
         
     def is_clash_with_live_cube(self, eye: Vector3, time: float):
         for grid in Grid3D.get_grids(eye, None):
-            if grid in self.live_map:
-                index = self.live_map[grid]
-                self.live_cube = LiveCube(index)
-                pos = self.live_cube.get_position(time) 
-                return AABB.is_intersect(eye, pos)
+            for index in self.live_index.active(grid, time):
+                if AABB.is_intersect(eye, self.live_table.get_position(index, time)):
+                    self.live_cube = index
+                    return True
         return False
         
     def is_land_on_live_cube(self, eye: Vector3, time: float):
-        pos = self.live_cube.get_position(time)
+        pos = self.live_table.get_position(self.live_cube, time)
         return AABB.is_land_on(eye, pos)
     
     def reset_eye_position(self, eye_pos: Vector3):
         eye_z = eye_pos.z
         x, y, z = Grid3D.point_3d_to_index(eye_pos.tolist())
-        while ((x, y, z) in self.scene_map) or ((x, y, z-1) in self.scene_map): 
+        occupied = self.scene_map.occupied
+        while occupied(x, y, z) or occupied(x, y, z-1): 
             z += 1
             eye_z += unit_size
-        while z>1 and ((x, y, z-2) not in self.scene_map):
+        while z>1 and not occupied(x, y, z-2):
             z -= 1
             eye_z -= unit_size
         if z<=1 and (not SceneGenerator.is_in_grid(eye_pos.xy)):
             return None  
         return Vector3([eye_pos.x, eye_pos.y, eye_z])
     
+    # Batched collision queries: (n, 3) eye positions (agents or sub-steps)
+    # are converted to grid cells in one NumPy call and tested against the
+    # occupancy grid in one pass. Results match the single-eye methods.
+    def get_clash_points_batch(self, positions):
+        positions = numpy.asarray(positions, dtype='f8').reshape(-1, 3)
+        n = len(positions)
+        eye_z = numpy.trunc(positions[:, 2] / unit_size).astype('i8')
+        cells = numpy.empty((n, 2, 4, 3), dtype='i8')
+        cells[:, :, :, :2] = Grid3D.get_box_2d_indices(positions)[:, None, :, :]
+        cells[:, 0, :, 2] = (eye_z - 1)[:, None]   #body
+        cells[:, 1, :, 2] = eye_z[:, None]   #head
+        hits = self.scene_map.contains_cells(cells.reshape(-1, 3)).reshape(n, 2, 4)
+        bits = 1 << numpy.arange(4)
+        return (hits[:, 0] * bits).sum(axis=1) + ((hits[:, 1] * bits).sum(axis=1) << 4)
+    
+    def is_on_air_batch(self, eyes):
+        eyes = numpy.asarray(eyes, dtype='f8').reshape(-1, 3)
+        foot = eyes[:, 2] - body_height
+        grounded = (foot < base_center[2]) & SceneGenerator.are_in_grid(eyes[:, :2])
+        z_index = numpy.trunc((foot - half_unit) / unit_size).astype('i8')
+        cells = numpy.empty((len(eyes), 4, 3), dtype='i8')
+        cells[:, :, :2] = Grid3D.get_box_2d_indices(eyes)
+        cells[:, :, 2] = z_index[:, None]
+        supported = self.scene_map.contains_cells(cells.reshape(-1, 3)).reshape(-1, 4).any(axis=1)
+        return ~(grounded | supported)
+    
+    # static part of detect_clash_in_fly, without the landing sound
+    def detect_clash_in_fly_batch(self, positions, dir):
+        positions = numpy.asarray(positions, dtype='f8').reshape(-1, 3)
+        foot = positions[:, 2] - body_height
+        landed = (foot < 0) & SceneGenerator.are_in_grid(positions[:, :2])
+        cells, valid = Grid3D.get_grids_batch(positions, dir)
+        hits = self.scene_map.contains_cells(cells.reshape(-1, 3)).reshape(valid.shape) & valid
+        return landed | hits.any(axis=1)
+    
     # Validate if we can place cube in the position
     # 0: Ok to put
     # 1: Below ground is not allowed
@@ -118,7 +159,7 @@ class ClashDetector(object):
         if cube in self.scene_map:
             logger.warning("Clash with static cube!")
             return False
-        if cube in self.live_map:
+        if cube in self.live_index:
             logger.warning("Clash with live cube!")
             return False
         
@@ -137,9 +178,9 @@ class ClashDetector(object):
         for corner in corners:
             clash = 0x00
             x, y = Grid3D.point_2d_to_index(corner)
-            if (x, y, eye_z-1) in self.scene_map:   #check body
+            if self.scene_map.occupied(x, y, eye_z-1):   #check body
                 clash += index
-            if (x, y, eye_z) in self.scene_map:   #check head
+            if self.scene_map.occupied(x, y, eye_z):   #check head
                 clash += (index<<4)
             clash_points += clash
             index = index << 1
@@ -180,19 +221,22 @@ class ClashDetector(object):
               
 class SceneTracker(object):
     def __init__(self):
-        self.scene_map = dict()
-        self.live_map = dict()
+        self.scene_map = OccupancyGrid()    #cleared in place, the ray picker keeps a reference
+        self.live_index = LiveIndex()
+        self.live_table = LiveCubeTable()
         self.follow_up = None
         self.fall_down = False
-        self.clash_dector = ClashDetector(self.scene_map, self.live_map)
+        self.clash_dector = ClashDetector(self.scene_map, self.live_index, self.live_table)
         
-    def reload(self, cubes: list):
+    def reload(self, cubes: CubeStore):
         self.scene_map.clear()
         self.add_cubes(cubes)
     
-    def reload_live_cubes(self, cubes: list):
-        self.live_map.clear()
-        self.add_live_cubes(cubes)
+    def reload_live_cubes(self, paths):
+        self.live_index.clear()
+        self.live_table.load(paths)
+        for index in range(self.live_table.count):
+            self.live_index.add(index, self.live_table.paths[index])
     
     def move_to(self,
                 from_pos: Vector3,
@@ -225,29 +269,24 @@ class SceneTracker(object):
             return (next_pos, ClashType.LiveXY)
         return (to_pos, ClashType.NoClash)
 
-    def add_cubes(self, cubes: list):
-        count = len(cubes)
-        for i in range(0, count, 6):
-            self.add_cube((cubes[i],cubes[i+1],cubes[i+2]))
+    def add_cubes(self, cubes: CubeStore):
+        self.add_cells(cubes.cells())
+    
+    # cells: (n, 3) grid indices
+    def add_cells(self, cells):
+        self.scene_map.add_cells(cells)
+    
+    def remove_cells(self, cells):
+        self.scene_map.remove_cells(cells)
            
     def add_cube(self, center = (0.0, 0,0, 0.0)):
-        center_key = Grid3D.offset_3d_to_index(center)
-        self.scene_map[center_key] = True
+        self.scene_map.add(*Grid3D.offset_3d_to_index(center))
     
     def remove_cube(self, center = (0.0, 0.0, 0.0)):
-        center_key = Grid3D.offset_3d_to_index(center)
-        if center_key in self.scene_map:
-            del self.scene_map[center_key]
-    
-    def add_live_cubes(self, cubes: list):
-        count = len(cubes)
-        for i in range(0, count, 9):
-            self.add_live_cube(i//9)
+        self.scene_map.remove(*Grid3D.offset_3d_to_index(center))
     
-    def add_live_cube(self, index):
-        cube = LiveCube(index)
-        for grid in cube.get_range():
-            self.live_map[grid] = index
+    def add_live_cube(self, path):
+        self.live_index.add(self.live_table.append(path), path)
         
     def reset_eye_position(self, pos):
         return self.clash_dector.reset_eye_position(pos)
@@ -0,0 +1,84 @@
+import queue
+import threading
+import uuid
+import moderngl as gl
+from collections import deque
+from logger import logger
+from resource_manager import ResourceManger
+
+# frames between reading the screen into a pixel buffer and mapping it
+capture_latency = 2
+
+# Screenshots read the finished frame into pixel buffer objects and map them
+# a few frames later, so the render thread never waits for the GPU. The PNG
+# encoding and file write run on a worker thread behind a bounded queue,
+# captures beyond max_pending are dropped instead of stalling the frame.
+# The worker and PIL are only started / imported by the first capture.
+class ScreenCapture(object):
+    def __init__(self,
+                 ctx: gl.Context,
+                 fbo: gl.Framebuffer,
+                 max_pending = 4):
+        self.ctx = ctx
+        self.fbo = fbo    #the window's default framebuffer
+        self.max_pending = max_pending
+        self.requested = False
+        self.pending = deque()    #(frame, size, pbo)
+        self.free_pbos = []
+        self.images = queue.Queue(maxsize=max_pending)
+        self.worker = None
+
+    # capture the next finished frame
+    def request(self):
+        self.requested = True
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._save_images, daemon=True)
+            self.worker.start()
+
+    # call at the end of every frame, before swapping buffers
+    def update(self, frame: int):
+        self._resolve(frame)
+        if not self.requested:
+            return
+        self.requested = False
+        if len(self.pending) >= self.max_pending:
+            logger.warning("Too many screenshots pending, capture dropped!")
+            return
+
+        size = self.fbo.size
+        nbytes = size[0] * size[1] * 3
+        pbo = self.free_pbos.pop() if self.free_pbos else None
+        if pbo is None or pbo.size != nbytes:
+            if pbo is not None:    #window resized
+                pbo.release()
+            pbo = self.ctx.buffer(reserve=nbytes)
+        self.fbo.read_into(pbo, components=3, alignment=1)
+        self.pending.append((frame, size, pbo))
+
+    # wait until every capture is written
+    def flush(self):
+        self._resolve(None)
+        self.images.join()
+
+    def _resolve(self, frame):
+        while self.pending and (frame is None or frame - self.pending[0][0] >= capture_latency):
+            _, size, pbo = self.pending.popleft()
+            data = pbo.read()
+            self.free_pbos.append(pbo)
+            try:
+                self.images.put_nowait((size, data))
+            except queue.Full:
+                logger.warning("Screenshot writer is behind, capture dropped!")
+
+    def _save_images(self):
+        from PIL import Image
+        while True:
+            size, data = self.images.get()
+            try:
+                file_name = ResourceManger.get_screenshot(uuid.uuid4())
+                Image.frombytes('RGB', size, data, 'raw', 'RGB', 0, -1).save(file_name)
+                logger.info(f"Screenshot: {file_name}")
+            except Exception as e:
+                logger.error(f"Error saving screenshot: {e}")
+            finally:
+                self.images.task_done()
@@ -0,0 +1,72 @@
+import builtins
+import sys
+import time
+
+# imports faster than this are left out of the report
+import_threshold_ms = 1.0
+
+# Startup phases from the first line of the entry script to the first frame.
+# mark(name) ends the phase `name` started by the previous mark. With
+# trace_imports, every first import through the import statement is timed
+# (cumulative, nested imports are indented), like python -X importtime but
+# limited to the imports that matter. Modules loaded by importlib (e.g. the
+# window class of moderngl_window) count towards the phase they run in.
+class StartupProfile(object):
+    def __init__(self, trace_imports = False):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []    #(name, ms)
+        self.imports = []    #[depth, module, ms, phase] in import order
+        self.depth = 0
+        self.first_frame_ms = None
+        self._import = None
+        if trace_imports:
+            self._import = builtins.__import__
+            builtins.__import__ = self._traced_import
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        self.phases.append((name, (now - self.last) * 1000.0))
+        self.last = now
+
+    # end of the first frame, after swapping buffers
+    def first_frame(self):
+        if self.first_frame_ms is None:
+            self.mark('first frame')
+            self.first_frame_ms = (self.last - self.start) * 1000.0
+
+    # stop timing imports
+    def close(self):
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def report(self):
+        lines = ["phase              ms   total"]
+        total = 0.0
+        for name, ms in self.phases:
+            total += ms
+            lines.append("{:<14} {:>7.1f} {:>7.1f}".format(name, ms, total))
+        if self.imports:
+            lines.append("imports (cumulative ms)")
+            phase_names = [name for name, _ in self.phases] + ['-']
+            for depth, module, ms, phase in self.imports:
+                if ms >= import_threshold_ms:
+                    lines.append("{:>7.1f}  {}{}  [{}]".format(
+                        ms, "  " * depth, module, phase_names[phase]))
+        if self.first_frame_ms is not None:
+            lines.append("Time to first frame: {:.1f}ms".format(self.first_frame_ms))
+        return lines
+
+    def _traced_import(self, name, globals = None, locals = None, fromlist = (), level = 0):
+        if level != 0 or name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+        entry = [self.depth, name, 0.0, len(self.phases)]
+        self.imports.append(entry)
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            entry[2] = (time.perf_counter() - start) * 1000.0
+            self.depth -= 1
@@ -0,0 +1,60 @@
+import os
+import sys
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from scene_generator import unit_size
+from cube_store import CubeStore, chunk_size, lod_margin
+from chunk_mesher import ChunkMesher
+
+color = numpy.array((1.0, 0.0, 0.0), dtype='f4')
+
+def store_with(cells):
+    store = CubeStore()
+    for cell in cells:
+        store.add(numpy.array(cell, dtype='f4') * unit_size, color)
+    store.dirty.clear()
+    return store
+
+# a coarse face on the chunk border may only be hidden by a neighbour layer
+# that covers it completely at full detail
+@pytest.mark.parametrize('scale', (2, 4))
+def test_coarse_border_faces_leave_no_cracks(scale):
+    rng = numpy.random.default_rng(scale)
+    store = store_with(rng.integers(-chunk_size, 2*chunk_size, (6000, 3)).tolist())
+    n = chunk_size // scale
+    for chunk in store.chunks.values():
+        full = ChunkMesher.occupancy(store, chunk)
+        coarse = ChunkMesher._downsample(full, scale)
+        for axis in range(3):
+            for side in (-1, 1):
+                faces = ChunkMesher.exposed_faces(coarse, axis, side)
+                border = [slice(None)] * 3
+                border[axis] = 0 if side < 0 else n-1
+                hidden = coarse[1:-1, 1:-1, 1:-1][tuple(border)] & ~faces[tuple(border)]
+                layer = [slice(1, -1)] * 3
+                layer[axis] = 0 if side < 0 else -1
+                covered = full[tuple(layer)].reshape(n, scale, n, scale).all(axis=(1, 3))
+                assert not (hidden & ~covered).any()
+
+def test_half_covered_border_keeps_coarse_face():
+    # a full 4x4 wall at x = 15 in chunk 0, the next chunk covers half of it
+    wall = [(chunk_size-1, y, z) for y in range(4) for z in range(4)]
+    cover = [(chunk_size, y, z) for y in range(2) for z in range(4)]
+    store = store_with(wall + cover)
+    vertices = ChunkMesher.mesh(store, store.chunks[(0, 0, 0)], scale=4)
+    normals = vertices[:, 3:6]
+    assert (normals[:, 0] > 0).any()
+
+def test_edits_near_the_border_drop_neighbour_lods():
+    store = store_with([(0, 0, 0)])
+    store.add(numpy.array((lod_margin-1, 5, 5), dtype='f4') * unit_size, color)
+    assert (-1, 0, 0) in store.lod_dirty
+    assert (-1, 0, 0) not in store.dirty
+    store.lod_dirty.clear()
+    store.add(numpy.array((lod_margin, 5, 5), dtype='f4') * unit_size, color)
+    assert not store.lod_dirty
+    store.add(numpy.array((0, 6, 5), dtype='f4') * unit_size, color)
+    assert (-1, 0, 0) in store.dirty
@@ -0,0 +1,112 @@
+import os
+import sys
+import numpy
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from scene_generator import unit_size
+from cube_store import CubeStore, cube_dtype, chunk_size, cell_to_chunk, offset_to_cell
+
+def random_store(count, seed = 0, extent = 2*chunk_size):
+    rng = numpy.random.default_rng(seed)
+    cubes = numpy.zeros(count, dtype=cube_dtype)
+    cubes['pos'] = rng.integers(-extent, extent, (count, 3)) * unit_size
+    cubes['color'] = rng.random((count, 3))
+    store = CubeStore()
+    store.insert(cubes)
+    return store
+
+def test_remove_chunk_remaps_the_moved_ids():
+    store = random_store(3000)
+    before = store.instances.copy()
+    key = cell_to_chunk(offset_to_cell(before['pos'][0]))
+    remapped = store.remove_chunk(key)
+    for id, cube in enumerate(before):
+        in_chunk = cell_to_chunk(offset_to_cell(cube['pos'])) == key
+        new = remapped.get(id, id)
+        if in_chunk:
+            assert new is None
+        else:
+            assert new is not None
+            assert (store.instances[new] == cube)
+    assert key not in store.chunks
+
+def test_compose_remap_follows_ids_through_evictions():
+    store = random_store(3000, seed=1)
+    before = store.instances.copy()
+    keys = list(store.chunks)[:5]
+    remapped = dict()
+    for key in keys:
+        remapped = CubeStore.compose_remap(remapped, store.remove_chunk(key))
+    for id, cube in enumerate(before):
+        new = remapped.get(id, id)
+        if cell_to_chunk(offset_to_cell(cube['pos'])) in keys:
+            assert new is None
+        else:
+            assert (store.instances[new] == cube)
+
+def cube_at(cell, color = (1.0, 0.0, 0.0)):
+    return (numpy.array(cell, dtype='f4') * unit_size, numpy.array(color, dtype='f4'))
+
+# every cube is found at its cell under the id it is stored at
+def assert_indexed(store):
+    for id, cube in enumerate(store.instances):
+        assert store.find(cube['pos']) == id
+    assert sum(chunk.count for chunk in store.chunks.values()) == len(store)
+
+def test_add_refuses_occupied_cells():
+    store = CubeStore(capacity=2)
+    assert store.add(*cube_at((0, 0, 0))) == 0
+    assert store.add(*cube_at((0, 0, 0), (0.0, 1.0, 0.0))) is None
+    assert store.add(*cube_at((-1, 0, 0))) == 1
+    assert store.add(*cube_at((0, 0, -1))) == 2
+    assert len(store) == 3
+    assert_indexed(store)
+
+def test_remove_swaps_the_last_cube_in():
+    store = CubeStore()
+    for x in range(5):
+        store.add(*cube_at((x, 0, 0), (x, 0.0, 0.0)))
+    assert store.remove(1) == 4
+    assert store.position(1).tolist() == [4 * unit_size, 0.0, 0.0]
+    assert store.color(1).tolist() == [4.0, 0.0, 0.0]
+    assert store.find(cube_at((1, 0, 0))[0]) is None
+    assert store.remove(3) is None    #the last cube, nothing moves
+    assert len(store) == 3
+    assert_indexed(store)
+
+def test_random_edits_keep_ids_and_cells_in_sync():
+    rng = numpy.random.default_rng(3)
+    store = CubeStore(capacity=4)
+    cells = dict()    #cell: color
+    for step in range(3000):
+        cell = tuple(rng.integers(-chunk_size, chunk_size, 3).tolist())
+        pos, color = cube_at(cell, rng.random(3))
+        id = store.find(pos)
+        op = rng.random()
+        if op < 0.5:
+            if store.add(pos, color) is not None:
+                cells[cell] = color
+        elif op < 0.8 and id is not None:
+            store.remove(id)
+            del cells[cell]
+        elif id is not None:
+            target = tuple(rng.integers(-chunk_size, chunk_size, 3).tolist())
+            if store.move(id, cube_at(target)[0]):
+                cells[target] = cells.pop(cell)
+    assert len(store) == len(cells)
+    assert_indexed(store)
+    for cell, color in cells.items():
+        id = store.find(cube_at(cell)[0])
+        assert numpy.allclose(store.color(id), color)
+
+def test_insert_keeps_the_first_cube_of_a_cell():
+    store = CubeStore()
+    store.add(*cube_at((0, 0, 0)))
+    cubes = numpy.zeros(3, dtype=cube_dtype)
+    cubes['pos'] = numpy.array([(0, 0, 0), (5, 0, 0), (5, 0, 0)]) * unit_size
+    cubes['color'] = [(0, 1, 0), (0, 0, 1), (1, 1, 1)]
+    assert store.insert(cubes) == 1
+    assert store.color(store.find(cubes['pos'][1])).tolist() == [0.0, 0.0, 1.0]
+    assert store.color(store.find(cubes['pos'][0])).tolist() == [1.0, 0.0, 0.0]
+    assert_indexed(store)
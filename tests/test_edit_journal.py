@@ -0,0 +1,114 @@
+import os
+import shutil
+import sys
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from resource_manager import ResourceManger
+from cube_store import CubeStore, cube_dtype
+from edit_journal import EditJournal, journal_ext, compacting_ext
+from scene_file import SceneFile, binary_ext
+
+color = (1.0, 0.0, 0.0)
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "data")
+    monkeypatch.setattr(ResourceManger, 'resource_dir', str(tmp_path))
+    return tmp_path / "data"
+
+def cubes_at(store: CubeStore):
+    return sorted(map(tuple, store.instances['pos'].tolist()))
+
+def load(data_dir, name):
+    store = CubeStore()
+    snapshot = data_dir / (name + binary_ext)
+    if snapshot.exists():
+        store.load(numpy.array(SceneFile.read(str(snapshot))))
+    return store
+
+# edits, then a compaction that crashes after replacing the snapshot but
+# before deleting the compacting journal, then a restart
+def crash_after_snapshot(data_dir, initial, edit):
+    name = "scene"
+    records = numpy.zeros(len(initial), dtype=cube_dtype)
+    records['pos'] = numpy.array(initial, dtype='f4').reshape(-1, 3)
+    records['color'] = color
+    SceneFile.write(str(data_dir / (name + binary_ext)), records)
+
+    store = load(data_dir, name)
+    journal = EditJournal(store)
+    journal.open(name)
+    edit(store, journal)
+    journal.commit()
+    expected = cubes_at(store)
+    journal_copy = str(data_dir / "journal.copy")
+    shutil.copy(data_dir / (name + journal_ext), journal_copy)
+    journal.compact()
+    journal.close()
+    os.replace(journal_copy, data_dir / (name + compacting_ext))
+
+    store = load(data_dir, name)
+    journal = EditJournal(store)
+    journal.open(name)
+    journal.close()
+    assert not (data_dir / (name + compacting_ext)).exists()
+    assert cubes_at(store) == expected
+    return expected
+
+def test_add_then_move_is_not_replayed_twice(data_dir):
+    def edit(store, journal):
+        store.add((1.0, 0.0, 0.0), color)
+        journal.cube_added((1.0, 0.0, 0.0), color)
+        store.move(store.find((1.0, 0.0, 0.0)), (2.0, 0.0, 0.0))
+        journal.cube_moved((1.0, 0.0, 0.0), (2.0, 0.0, 0.0))
+    assert crash_after_snapshot(data_dir, [], edit) == [(2.0, 0.0, 0.0)]
+
+def test_remove_then_move_into_the_hole_is_not_replayed_twice(data_dir):
+    def edit(store, journal):
+        store.remove(store.find((1.0, 0.0, 0.0)))
+        journal.cube_removed((1.0, 0.0, 0.0))
+        store.move(store.find((3.0, 0.0, 0.0)), (1.0, 0.0, 0.0))
+        journal.cube_moved((3.0, 0.0, 0.0), (1.0, 0.0, 0.0))
+    initial = [(1.0, 0.0, 0.0), (3.0, 0.0, 0.0)]
+    assert crash_after_snapshot(data_dir, initial, edit) == [(1.0, 0.0, 0.0)]
+
+# edits made after the compaction are still replayed on top of the new snapshot
+def test_journal_after_compaction_is_replayed(data_dir):
+    name = "scene"
+    store = load(data_dir, name)
+    journal = EditJournal(store)
+    journal.open(name)
+    store.add((1.0, 0.0, 0.0), color)
+    journal.cube_added((1.0, 0.0, 0.0), color)
+    journal.compact()
+    store.add((2.0, 0.0, 0.0), color)
+    journal.cube_added((2.0, 0.0, 0.0), color)
+    journal.close()
+
+    store = load(data_dir, name)
+    journal = EditJournal(store)
+    assert journal.open(name) == 1
+    journal.close()
+    assert cubes_at(store) == [(1.0, 0.0, 0.0), (2.0, 0.0, 0.0)]
+
+# a compaction that crashes before the snapshot is replaced is finished on open
+def test_crash_before_snapshot_is_replayed_once(data_dir):
+    name = "scene"
+    store = load(data_dir, name)
+    journal = EditJournal(store)
+    journal.open(name)
+    store.add((1.0, 0.0, 0.0), color)
+    journal.cube_added((1.0, 0.0, 0.0), color)
+    journal.close()
+    os.replace(data_dir / (name + journal_ext), data_dir / (name + compacting_ext))
+
+    for _ in range(2):
+        store = load(data_dir, name)
+        journal = EditJournal(store)
+        journal.open(name)
+        journal.close()
+        assert cubes_at(store) == [(1.0, 0.0, 0.0)]
+    assert not (data_dir / (name + compacting_ext)).exists()
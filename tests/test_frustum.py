@@ -0,0 +1,45 @@
+import os
+import sys
+import numpy
+from pyrr import Matrix44
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from frustum import Frustum
+
+def camera(eye = (0.0, 0.0, 0.0), target = (0.0, 10.0, 0.0)):
+    proj = Matrix44.perspective_projection(60.0, 16/9, 0.1, 100.0)
+    view = Matrix44.look_at(eye, target, (0.0, 0.0, 1.0))
+    return proj, view
+
+# a point is inside every plane exactly when its clip coordinates are inside the clip volume
+def test_planes_match_clip_space():
+    proj, view = camera((1.0, -2.0, 3.0), (4.0, 5.0, 2.0))
+    frustum = Frustum(proj, view)
+    assert numpy.allclose(numpy.linalg.norm(frustum.planes[:, :3], axis=1), 1.0)
+    rng = numpy.random.default_rng(0)
+    points = rng.uniform(-60.0, 60.0, (5000, 3))
+    homogeneous = numpy.hstack((points, numpy.ones((len(points), 1))))
+    clip = homogeneous @ numpy.asarray(view, dtype='f8') @ numpy.asarray(proj, dtype='f8')
+    inside_clip = (numpy.abs(clip[:, :3]) <= clip[:, 3:]).all(axis=1)
+    inside_planes = (homogeneous @ frustum.planes.T >= 0).all(axis=1)
+    assert inside_planes.tolist() == inside_clip.tolist()
+    assert inside_clip.any()
+
+def test_box_visibility():
+    frustum = Frustum(*camera())
+    assert frustum.box_visible((-1, 9, -1), (1, 11, 1))    #ahead
+    assert not frustum.box_visible((-1, -11, -1), (1, -9, 1))    #behind
+    assert not frustum.box_visible((-1, 200, -1), (1, 202, 1))    #past the far plane
+    assert not frustum.box_visible((50, 9, -1), (52, 11, 1))    #off to the side
+    assert frustum.box_visible((-100, 9, -1), (100, 11, 1))    #straddles every side plane
+    assert frustum.box_visible((-1, -1, -1), (1, 1, 1))    #contains the eye
+
+def test_boxes_visible_matches_box_visible():
+    frustum = Frustum(*camera((2.0, 3.0, 1.0), (-5.0, 8.0, 4.0)))
+    rng = numpy.random.default_rng(1)
+    box_min = rng.uniform(-50.0, 50.0, (500, 3))
+    box_max = box_min + rng.uniform(0.0, 8.0, (500, 3))
+    batch = frustum.boxes_visible(box_min, box_max)
+    assert batch.tolist() == [frustum.box_visible(lo, hi) for lo, hi in zip(box_min, box_max)]
+    assert batch.any() and not batch.all()
@@ -0,0 +1,78 @@
+import os
+import sys
+import numpy
+import pytest
+from pyrr import Vector3
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from scene_generator import unit_size, half_unit, base_center, body_clash, body_height
+from scene_objects import Grid3D
+from scene_tracker import ClashDetector
+from occupancy_grid import OccupancyGrid
+from live_index import LiveIndex
+from scene_linker import LiveCubeTable
+
+class Silent(object):
+    def play(self):
+        pass
+
+# random eyes plus eyes whose box corners, head and foot levels sit exactly
+# on half-unit cell edges, on both sides of the origin
+def eye_positions(count = 2000, seed = 0):
+    rng = numpy.random.default_rng(seed)
+    eyes = rng.uniform(-12.0, 12.0, (count, 3))
+    eyes[:, 2] = rng.uniform(-1.0, 8.0, count)
+    edges = rng.integers(-10, 10, (count, 3)) * unit_size + half_unit
+    edges[:, :2] += rng.choice((-body_clash, body_clash), (count, 2))
+    edges[:, 2] += rng.choice((0.0, body_clash, -body_clash, body_height, unit_size), count)
+    edges += base_center
+    return numpy.concatenate((eyes, edges))
+
+@pytest.fixture
+def detector():
+    rng = numpy.random.default_rng(1)
+    scene_map = OccupancyGrid()
+    scene_map.add_cells(rng.integers(-12, 12, (3000, 3)) * (1, 1, 0) + rng.integers(0, 8, (3000, 1)) * (0, 0, 1))
+    detector = ClashDetector(scene_map, LiveIndex(), LiveCubeTable())
+    detector.land_sound = Silent()
+    return detector
+
+def test_offsets_to_indices_matches_offsets_to_index():
+    rng = numpy.random.default_rng(2)
+    offsets = numpy.concatenate((rng.uniform(-20.0, 20.0, 5000),
+                                 numpy.arange(-20, 21) * unit_size + half_unit,
+                                 numpy.arange(-20, 21) * unit_size - half_unit,
+                                 numpy.arange(-20, 21) * unit_size, [0.0, -0.0]))
+    assert Grid3D.offsets_to_indices(offsets).tolist() == Grid3D.offsets_to_index(offsets.tolist())
+
+def test_box_2d_indices_match_the_corners():
+    eyes = eye_positions()
+    batch = Grid3D.get_box_2d_indices(eyes)
+    for eye, cells in zip(eyes, batch.tolist()):
+        corners = Grid3D.get_box_2d(Vector3(eye))
+        assert [list(Grid3D.point_2d_to_index(corner)) for corner in corners] == cells
+
+@pytest.mark.parametrize('dir', (0, None, 1, -1))
+def test_get_grids_batch_matches_get_grids(dir):
+    eyes = eye_positions()
+    cells, valid = Grid3D.get_grids_batch(eyes, dir)
+    for eye, eye_cells, eye_valid in zip(eyes, cells, valid):
+        expected = [list(cell) for cell in Grid3D.get_grids(Vector3(eye), dir)]
+        assert eye_cells[eye_valid].tolist() == expected
+
+def test_clash_points_batch(detector):
+    eyes = eye_positions()
+    batch = detector.get_clash_points_batch(eyes)
+    assert batch.tolist() == [detector._get_clash_points(Vector3(eye)) for eye in eyes]
+
+def test_on_air_batch(detector):
+    eyes = eye_positions()
+    batch = detector.is_on_air_batch(eyes)
+    assert batch.tolist() == [detector.is_on_air(Vector3(eye)) for eye in eyes]
+
+@pytest.mark.parametrize('dir', (0, 1, -1))
+def test_clash_in_fly_batch(detector, dir):
+    eyes = eye_positions()
+    batch = detector.detect_clash_in_fly_batch(eyes, dir)
+    assert batch.tolist() == [detector.detect_clash_in_fly(Vector3(eye), dir) for eye in eyes]
@@ -0,0 +1,32 @@
+import os
+import sys
+import numpy
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from resource_manager import ResourceManger
+from scene_objects import SceneObjects
+from motion_path import MotionPath, MotionKind
+
+def test_save_keeps_speed_and_phase(tmp_path, monkeypatch):
+    monkeypatch.setattr(ResourceManger, 'resource_dir', str(tmp_path))
+    (tmp_path / 'data').mkdir()
+    paths = MotionPath.random(50, seed=4)
+    paths['speed'] *= 0.12345
+    paths['phase'] += 0.0004321
+    SceneObjects.save_live_cubes(paths, 'live')
+    data = (tmp_path / 'data' / 'live.scene').read_text()
+    loaded = SceneObjects.read_live_cubes(data, 'live')
+    for field in paths.dtype.names:
+        assert numpy.allclose(loaded[field], paths[field], rtol=1e-5, atol=1e-6)
+
+def test_malformed_lines_are_skipped():
+    circle = MotionPath.path(MotionKind.Circle, (1, 2, 3), (1, 0, 0), (0, 1, 0), speed=0.5, phase=0.25)
+    line = ' '.join(map(str, circle.view('f4').tolist()))
+    data = '\n'.join((line, '1 2 3', '', 'nan? 1 2 3 4 5 6 7 8',
+                      '0 0 0.5 1 0 0 0.2 0.3 0.4', line + ' 9'))
+    loaded = SceneObjects.read_live_cubes(data, 'live')
+    assert len(loaded) == 2
+    assert loaded[0] == circle[0]
+    assert loaded['kind'][1] == MotionKind.Linear.value and loaded['speed'][1] == 1.0
+    assert loaded['color'][1].tolist() == numpy.float32([0.2, 0.3, 0.4]).tolist()
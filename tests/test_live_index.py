@@ -0,0 +1,41 @@
+import os
+import sys
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from scene_generator import unit_size
+from motion_path import MotionPath, MotionKind
+from live_index import LiveIndex
+
+# every cell a live cube overlaps at any time must list the cube as active
+@pytest.mark.parametrize('kind', list(MotionKind))
+def test_active_cubes_match_brute_force(kind):
+    paths = MotionPath.random(40, seed=kind.value)
+    paths['kind'] = kind.value
+    index = LiveIndex()
+    for i, path in enumerate(paths):
+        index.add(i, path)
+
+    rng = numpy.random.default_rng(kind.value)
+    times = rng.uniform(0.0, 20.0, 300)
+    checked = 0
+    for time in times:
+        centers = MotionPath.evaluate(paths, time) / unit_size
+        for i, center in enumerate(centers):
+            low = numpy.floor(center - 1.0).astype(int) + 1
+            high = numpy.ceil(center + 1.0).astype(int) - 1
+            for x in range(low[0], high[0]+1):
+                for y in range(low[1], high[1]+1):
+                    for z in range(low[2], high[2]+1):
+                        assert i in index.active((x, y, z), time)
+                        checked += 1
+    assert checked > 10000
+
+def test_still_cube_is_always_active():
+    index = LiveIndex()
+    index.add(0, MotionPath.path(MotionKind.Circle, (2.0, 0.0, 3.0), (1, 0, 0), (0, 1, 0), speed=0.0))
+    cell = (3, 0, 3)
+    assert cell in index
+    assert all(0 in index.active(cell, time) for time in (0.0, 1.3, 17.0))
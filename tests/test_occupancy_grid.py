@@ -0,0 +1,68 @@
+import os
+import sys
+import numpy
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+import occupancy_grid
+from occupancy_grid import OccupancyGrid
+
+def test_growing_in_one_direction_doubles_the_volume():
+    grid = OccupancyGrid()
+    sizes = set()
+    for x in range(4096):
+        grid.add(x, 0, 0)
+        sizes.add(grid.shape)
+    assert len(sizes) <= 10
+    assert len(grid) == 4096
+
+def test_far_cells_go_to_the_sparse_set():
+    grid = OccupancyGrid()
+    grid.add(0, 0, 0)
+    far = (10**6, -10**6, 10**6)
+    grid[far] = True
+    assert grid.volume.size <= occupancy_grid.max_volume
+    assert far in grid and (0, 0, 0) in grid
+    assert grid.box_occupied(numpy.subtract(far, 1), numpy.add(far, 1))
+    assert len(grid) == 2
+    del grid[far]
+    assert far not in grid and len(grid) == 1
+
+# random edits against a set, with a volume cap small enough to spill cells
+def test_matches_a_set_of_cells(monkeypatch):
+    monkeypatch.setattr(occupancy_grid, 'max_volume', 200000)
+    rng = numpy.random.default_rng(0)
+    grid, cells = OccupancyGrid(), set()
+    for step in range(5000):
+        spread = 40 if rng.random() < 0.05 else 1
+        op = rng.random()
+        if op < 0.6:
+            cell = tuple((rng.integers(-30, 30, 3) * spread).tolist())
+            grid.add(*cell)
+            cells.add(cell)
+        elif op < 0.8:
+            cell = tuple((rng.integers(-30, 30, 3) * spread).tolist())
+            assert grid.pop(cell) == (True if cell in cells else None)
+            cells.discard(cell)
+        elif op < 0.9:
+            batch = rng.integers(-40, 40, (20, 3)) * (30 if rng.random() < 0.5 else 1)
+            grid.add_cells(batch)
+            cells.update(map(tuple, batch.tolist()))
+        else:
+            batch = numpy.array(list(cells)[:15] + [(0, 0, 0)], dtype='i8')
+            grid.remove_cells(batch)
+            cells.difference_update(map(tuple, batch.tolist()))
+        assert len(grid) == len(cells)
+
+    assert grid.sparse
+    queries = rng.integers(-60, 60, (3000, 3))
+    queries[::3] *= 40
+    expected = [tuple(cell) in cells for cell in queries.tolist()]
+    assert grid.contains_cells(queries).tolist() == expected
+    assert all(cell in grid for cell in cells)
+    assert set(map(tuple, grid.to_cells().tolist())) == cells
+    for _ in range(200):
+        lo = rng.integers(-1500, 1500, 3)
+        hi = lo + rng.integers(0, 600, 3)
+        inside = any(all(lo[i] <= cell[i] <= hi[i] for i in range(3)) for cell in cells)
+        assert grid.box_occupied(lo, hi) == inside
@@ -0,0 +1,52 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from physics_stepper import PhysicsStepper
+
+class Recorder(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, t, dt):
+        self.calls.append((t, dt))
+
+def test_steps_consume_whole_steps():
+    stepper, step = PhysicsStepper(rate=100.0), Recorder()
+    alpha = stepper.advance(1.0, 0.025, step)
+    assert stepper.steps == 2
+    assert [t for t, _ in step.calls] == pytest.approx([1.01, 1.02])
+    assert all(dt == pytest.approx(0.01) for _, dt in step.calls)
+    assert alpha == pytest.approx(0.5)
+    assert stepper.render_time == pytest.approx(1.015)
+
+def test_leftover_carries_over_frames():
+    stepper, step = PhysicsStepper(rate=100.0), Recorder()
+    for _ in range(10):
+        stepper.advance(0.0, 0.0035, step)
+    assert len(step.calls) == 3
+    assert stepper.alpha == pytest.approx(0.5)
+
+# the simulation time tracks the wall clock whatever the frame rate
+@pytest.mark.parametrize('frame_time', (1/30, 1/60, 1/144, 0.0137))
+def test_time_follows_frame_time(frame_time):
+    stepper, step = PhysicsStepper(rate=120.0), Recorder()
+    frames = 500
+    for _ in range(frames):
+        stepper.advance(0.0, frame_time, step)
+    assert stepper.time + stepper.accumulator == pytest.approx(frames * frame_time)
+    assert stepper.render_time == pytest.approx(frames * frame_time - stepper.step_time)
+    assert stepper.dropped == 0.0
+
+def test_long_stall_drops_the_backlog():
+    stepper, step = PhysicsStepper(rate=100.0, max_steps=8), Recorder()
+    stepper.advance(0.0, 1.005, step)
+    assert stepper.steps == 8
+    assert stepper.time == pytest.approx(0.08)
+    assert stepper.dropped == pytest.approx(0.92)
+    assert stepper.alpha == pytest.approx(0.5)
+    stepper.advance(0.0, 0.01, step)
+    assert stepper.steps == 1
+    assert stepper.dropped == pytest.approx(0.92)
@@ -0,0 +1,67 @@
+import os
+import sys
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from scene_generator import unit_size, base_center
+from occupancy_grid import OccupancyGrid
+from ray_picker import RayPicker, no_pick
+
+def eye_at(cell):
+    return numpy.add(numpy.multiply(cell, unit_size), base_center)
+
+# (normal of the face the ray enters through, face id of cube_face_map)
+faces = (((0, 0, 1), 0), ((1, 0, 0), 1), ((0, -1, 0), 2),
+         ((-1, 0, 0), 3), ((0, 0, -1), 4), ((0, 1, 0), 5))
+
+@pytest.mark.parametrize('normal, face_id', faces)
+def test_face_id_of_the_face_entered(normal, face_id):
+    grid = OccupancyGrid()
+    cube = (2, -3, 4)
+    grid.add(*cube)
+    origin = eye_at(numpy.add(cube, numpy.multiply(normal, 5))) + (0.1, -0.2, 0.15)
+    pick = RayPicker(grid).pick(origin, numpy.negative(normal))
+    assert pick.tolist() == [cube[0]*unit_size, cube[1]*unit_size, cube[2]*unit_size, face_id]
+
+def test_ground_and_misses():
+    picker = RayPicker(OccupancyGrid())
+    pick = picker.pick(eye_at((3, 4, 5)), (0.0, 0.0, -1.0))
+    assert pick.tolist() == [3*unit_size, 4*unit_size, -1*unit_size, 0]
+    assert (picker.pick(eye_at((3, 4, 5)), (0.0, 0.0, 1.0)) == no_pick).all()
+    assert (picker.pick(eye_at((3, 4, 5)), (0.0, 0.0, 0.0)) == no_pick).all()
+    assert (picker.pick(eye_at((100, 0, 5)), (0.0, 0.0, -1.0)) == no_pick).all()
+
+# first occupied cell along the ray, marching in small steps
+def march(grid, origin, direction, step = 1e-3, limit = 40.0):
+    pos = (numpy.asarray(origin) - base_center) / unit_size
+    direction = numpy.asarray(direction) / numpy.linalg.norm(direction)
+    previous = tuple(numpy.floor(pos + 0.5).astype(int).tolist())
+    for t in numpy.arange(step, limit, step):
+        cell = tuple(numpy.floor(pos + t*direction + 0.5).astype(int).tolist())
+        if cell != previous and grid.occupied(*cell):
+            return cell
+        previous = cell
+    return None
+
+def test_matches_marching_along_the_ray():
+    rng = numpy.random.default_rng(0)
+    grid = OccupancyGrid()
+    grid.add_cells(rng.integers(-8, 8, (400, 3)) + (0, 0, 8))
+    picker = RayPicker(grid)
+    hits = 0
+    for _ in range(120):
+        origin = eye_at(rng.uniform((-10, -10, 0), (10, 10, 16)))
+        if grid.occupied(*numpy.floor((origin - base_center) / unit_size + 0.5).astype(int).tolist()):
+            continue
+        direction = rng.normal(size=3)
+        direction[2] = abs(direction[2])    #upwards, away from the ground plane
+        pick = picker.pick(origin, direction)
+        cell = march(grid, origin, direction)
+        if cell is None:
+            assert (pick == no_pick).all()
+        else:
+            assert pick[:3].tolist() == [c * unit_size for c in cell]
+            hits += 1
+    assert hits > 30
@@ -0,0 +1,90 @@
+import os
+import sys
+import struct
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(__file__, '../..')))
+
+from scene_generator import unit_size
+import scene_file
+from scene_file import SceneFile, header_format, header_align
+from cube_store import cube_dtype
+
+def random_cubes(count, seed = 0):
+    rng = numpy.random.default_rng(seed)
+    cubes = numpy.zeros(count, dtype=cube_dtype)
+    cubes['pos'] = rng.integers(-20, 20, (count, 3)) * unit_size
+    cubes['color'] = rng.random((count, 3))
+    return cubes
+
+@pytest.mark.parametrize('mmap', (True, False))
+def test_round_trip(tmp_path, mmap):
+    cubes = random_cubes(500)
+    file_path = str(tmp_path / 'scene.cubes')
+    SceneFile.write(file_path, cubes, generation=7)
+    records = SceneFile.read(file_path, mmap=mmap)
+    assert records.dtype == cube_dtype
+    assert (records == cubes).all()
+    assert SceneFile.generation(file_path) == 7
+    assert (os.path.getsize(file_path) - cubes.nbytes) % header_align == 0    #records start aligned
+
+def test_empty_file(tmp_path):
+    file_path = str(tmp_path / 'empty.cubes')
+    SceneFile.write(file_path, numpy.zeros(0, dtype=cube_dtype))
+    assert len(SceneFile.read(file_path)) == 0
+    assert SceneFile.generation(file_path) == 0
+
+# version 1 files have no generation field and read as generation 0
+def test_reads_version_1(tmp_path):
+    cubes = random_cubes(50, seed=1)
+    descr = SceneFile.encode_dtype(cubes.dtype)
+    file_path = str(tmp_path / 'old.cubes')
+    with open(file_path, 'wb') as file:
+        SceneFile.write_header(file, scene_file.magic, 1, len(cubes), len(descr), (descr,))
+        file.write(cubes.tobytes())
+    assert (SceneFile.read(file_path) == cubes).all()
+    assert SceneFile.generation(file_path) == 0
+
+def test_rejects_bad_headers(tmp_path):
+    file_path = str(tmp_path / 'bad.cubes')
+    with open(file_path, 'wb') as file:
+        file.write(b'not a scene')
+    with pytest.raises(ValueError):
+        SceneFile.read(file_path)
+    with open(file_path, 'wb') as file:
+        file.write(struct.pack(header_format, b'NOTSCENE', 1, 32, 0, 0) + bytes(8))
+    with pytest.raises(ValueError):
+        SceneFile.read(file_path)
+    SceneFile.write(file_path, random_cubes(3))
+    with open(file_path, 'r+b') as file:
+        file.seek(8)
+        file.write(struct.pack('<I', scene_file.version + 1))
+    with pytest.raises(ValueError):
+        SceneFile.read(file_path)
+    with pytest.raises(ValueError):
+        SceneFile.generation(file_path)
+
+def test_text_round_trip(tmp_path):
+    cubes = random_cubes(100, seed=2)
+    cubes['color'] = numpy.round(cubes['color'], 2)
+    file_path = str(tmp_path / 'scene.scene')
+    SceneFile.write_text(file_path, cubes)
+    with open(file_path, 'r') as file:
+        records = SceneFile.read_text(file.read(), cube_dtype)
+    assert numpy.allclose(records['pos'], cubes['pos'])
+    assert numpy.allclose(records['color'], cubes['color'])
+
+def test_convert(tmp_path):
+    cubes = random_cubes(20, seed=3)
+    text_path, binary_path = str(tmp_path / 'a.scene'), str(tmp_path / 'a.cubes')
+    SceneFile.write_text(text_path, cubes, fmt="%.6g")
+    assert SceneFile.convert(text_path, binary_path, cube_dtype) == 20
+    assert numpy.allclose(SceneFile.read(binary_path)['color'], cubes['color'], atol=1e-5)
+
+def test_as_records_converts_by_field():
+    wide = numpy.zeros(4, dtype=[('color', 'f8', (3,)), ('pos', 'f8', (3,)), ('extra', 'i4')])
+    wide['pos'] = numpy.arange(12).reshape(4, 3)
+    records = SceneFile.as_records(wide, cube_dtype)
+    assert records.dtype == cube_dtype
+    assert records['pos'].tolist() == wide['pos'].tolist()
@@ -0,0 +1,87 @@
+import numpy
+import moderngl as gl
+from resource_manager import ResourceManger
+
+# 5x7 bitmap font, one hex byte per glyph row, bit 4 is the leftmost pixel
+glyph_width = 5
+glyph_height = 7
+font_glyphs = {
+    ' ': "00000000000000", '0': "0E11131519110E", '1': "040C040404040E", '2': "0E11010204081F",
+    '3': "1F02040201110E", '4': "02060A121F0202", '5': "1F101E0101110E",
+    '6': "0608101E11110E", '7': "1F010204080808", '8': "0E11110E11110E", '9': "0E11110F01020C",
+    'A': "0E1111111F1111", 'B': "1E11111E11111E", 'C': "0E11101010110E", 'D': "1C12111111121C",
+    'E': "1F10101E10101F", 'F': "1F10101E101010", 'G': "0E11101711110F",
+    'H': "1111111F111111", 'I': "0E04040404040E", 'J': "0702020202120C", 'K': "11121418141211",
+    'L': "1010101010101F", 'M': "111B1515111111", 'N': "11111915131111", 'O': "0E11111111110E",
+    'P': "1E11111E101010", 'Q': "0E11111115120D", 'R': "1E11111E141211", 'S': "0F10100E01011E",
+    'T': "1F040404040404", 'U': "1111111111110E", 'V': "11111111110A04", 'W': "1111111515150A",
+    'X': "11110A040A1111", 'Y': "1111110A040404", 'Z': "1F01020408101F", '.': "00000000000C0C",
+    ':': "000C0C000C0C00", '%': "18190204081303", '/': "00010204081000", '-': "0000001F000000",
+    '_': "0000000000001F", '(': "02040808080402", ')': "08040202020408", '=': "00001F001F0000"}
+
+# texture unit of the font atlas, unit 0 holds the ground pick texture
+font_unit = 1
+
+# Screen space text in a bitmap font, for debug overlays.
+# Text is upper-cased, characters outside the font are drawn as blanks.
+class TextRender(object):
+    def __init__(self,
+                 ctx: gl.Context,
+                 size,
+                 scale = 2):
+        self.ctx = ctx
+        self.scale = scale
+        self.chars = {char: i for i, char in enumerate(font_glyphs)}
+        self.texture = ctx.texture((len(font_glyphs) * glyph_width, glyph_height), 1,
+                                   self._font_atlas().tobytes(), dtype='f1')
+        self.texture.filter = (gl.NEAREST, gl.NEAREST)
+        self.prog = ResourceManger.get_shader('text')
+        self.prog['screen_size'].value = tuple(size)
+        self.prog['font'].value = font_unit
+        self.vbo = ctx.buffer(reserve=4096)
+        self.vao = ctx.vertex_array(self.prog, [(self.vbo, '2f 2f', 'in_vert', 'in_uv')])
+        self.vertex_count = 0
+
+    # lines of text with the top left corner at (x, y) pixels from the top left of the screen
+    def set_text(self, lines, x = 8, y = 8):
+        vertices = []
+        line_height = (glyph_height + 3) * self.scale
+        advance = (glyph_width + 1) * self.scale
+        atlas_width = len(font_glyphs)
+        for row, line in enumerate(lines):
+            top = y + row * line_height
+            for column, char in enumerate(line.upper()):
+                glyph = self.chars.get(char, 0)
+                if glyph == 0:
+                    continue
+                left = x + column * advance
+                x0, x1 = left, left + glyph_width * self.scale
+                y0, y1 = top, top + glyph_height * self.scale
+                u0, u1 = glyph / atlas_width, (glyph + 1) / atlas_width
+                vertices.extend(((x0, y0, u0, 0.0), (x0, y1, u0, 1.0), (x1, y1, u1, 1.0),
+                                 (x0, y0, u0, 0.0), (x1, y1, u1, 1.0), (x1, y0, u1, 0.0)))
+        data = numpy.array(vertices, dtype='f4')
+        if data.nbytes > self.vbo.size:
+            self.vbo.orphan(data.nbytes)
+        if data.nbytes:
+            self.vbo.write(data)
+        self.vertex_count = len(vertices)
+
+    def render(self):
+        if self.vertex_count == 0:
+            return
+        self.ctx.disable(gl.DEPTH_TEST | gl.CULL_FACE)
+        self.texture.use(font_unit)
+        self.vao.render(gl.TRIANGLES, vertices=self.vertex_count)
+        self.ctx.enable(gl.DEPTH_TEST | gl.CULL_FACE)
+
+    @classmethod
+    def _font_atlas(cls):
+        atlas = numpy.zeros((glyph_height, len(font_glyphs) * glyph_width), dtype='u1')
+        for i, rows in enumerate(font_glyphs.values()):
+            for row in range(glyph_height):
+                bits = int(rows[2*row:2*row+2], 16)
+                for column in range(glyph_width):
+                    if bits & (0x10 >> column):
+                        atlas[row, i*glyph_width + column] = 255
+        return atlas